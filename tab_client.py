@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+'''A tiny client for "tabulate.py --serve", so that an editor can tabulate small tables
+without starting Python and importing everything again each time.
+
+Use it just like tabulate.py.  It sends the arguments and STDIN to the daemon
+listening on the Unix socket in $TABULATE_SOCKET (or a default in $XDG_RUNTIME_DIR or in
+a private folder in /tmp) and prints what comes back.  If there is no daemon yet, it starts one for next time,
+and does this call with tabulate.py in the usual way.
+'''
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+
+SOCKET = os.environ.get('TABULATE_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or f'/tmp/tabulate-{os.getuid()}', 'tabulate.sock')
+TABULATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tabulate.py')
+
+
+def check(path):
+    '''Raise PermissionError unless the socket at path is ours and only ours, in a folder
+    that nobody else can put another socket in (or a sticky one like /tmp), as the daemon checks'''
+    folder = os.stat(os.path.dirname(os.path.abspath(path)))
+    if folder.st_uid not in (0, os.getuid()) or folder.st_mode & 0o022 and not folder.st_mode & stat.S_ISVTX:
+        raise PermissionError(f'other users can change the folder of {path}')
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f'{path} is not a socket that only you can use')
+
+
+def ask(argv, text, path=SOCKET):
+    '''Send the arguments and the input text (as bytes) to the daemon,
+    and return the exit status, any error messages, and the output (as bytes)'''
+    check(path)
+    with socket.socket(socket.AF_UNIX) as s:
+        s.connect(path)
+        s.sendall(json.dumps({'argv': argv, 'cwd': os.getcwd()}).encode('utf-8') + b'\n' + text)
+        s.shutdown(socket.SHUT_WR)
+        with s.makefile('rb') as reply:
+            header = json.loads(reply.readline())
+            return header['status'], header['stderr'], reply.read()
+
+
+def main():
+    "Do one call, with or without the daemon"
+    reading = not any(arg == '--file' or arg.startswith('--file=') for arg in sys.argv[1:])
+    text = sys.stdin.buffer.read() if reading and not sys.stdin.isatty() else b''
+    try:
+        status, errors, output = ask(sys.argv[1:], text)
+    except (OSError, ValueError):
+        subprocess.Popen([sys.executable, TABULATE, '--serve', SOCKET], start_new_session=True,
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sys.exit(subprocess.run([sys.executable, TABULATE] + sys.argv[1:], input=text, check=False).returncode)
+
+    sys.stderr.write(errors)
+    sys.stdout.buffer.write(output)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
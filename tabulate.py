@@ -5,89 +5,142 @@ A module/script to line up text tables.
 Toby Thurston -- 21 Dec 2022
 '''
 
-import argparse
+import array
+import bisect
 import builtins
 import collections
-import csv
 import decimal
+import functools
 import io
 import itertools
 import math
+import operator
 import os
-import random
 import re
-import statistics
 import string
 import sys
-import textwrap
-import tokenize
-
-import tab_fun_dates
-import tab_fun_maths
-import tab_fun_useful
-
-# Panther is a big cat of functions for column maths, using the Decimal
-# versions.  This is used to limit the scope of the `eval` function when
-# evaluating expressions in DSL options.  So if you are calculating a new
-# column value with arr, or sorting on a calculated value etc, you can only use
-# the functions in this dictionary.  The idea is that the keys are what you the
-# user types and the values are the names of actual functions, either built-in
-# or provided by the helper modules.
-
-Panther = {
-    'abs': builtins.abs,
-    'bool': builtins.bool,
-    'chr': builtins.chr,
-    'divmod': builtins.divmod,
-    'format': builtins.format,
-    'int': builtins.int,
-    'ord': builtins.ord,
-    'pow': builtins.pow,
-    'round': builtins.round,
-    'str': builtins.str,
-    'reversed': lambda x: ''.join(reversed(x)),
-    'exp': lambda x: decimal.Decimal(x).exp(),
-    'log': lambda x: decimal.Decimal(x).ln(),
-    'log10': lambda x: decimal.Decimal(x).log10(),
-    'sqrt': lambda x: decimal.Decimal(x).sqrt(),
-    'caps': lambda x: str(x).capitalize(),
-    'lower': lambda x: str(x).lower(),
-    'upper': lambda x: str(x).upper(),
-    'randomd': lambda: decimal.Decimal(str(random.random())),
-    'mlog': tab_fun_maths.mlog,
-    'mexp': tab_fun_maths.mexp,
-    'angle': tab_fun_maths.angle,
-    'dir': tab_fun_maths.dir,
-    'floor': math.floor,
-    'time': tab_fun_dates.as_time,
-    'base': tab_fun_dates.base,
-    'date': tab_fun_dates.date,
-    'dow': tab_fun_dates.dow,
-    'epoch': tab_fun_dates.epoch,
-    'hms': tab_fun_dates.hms,
-    'hr': tab_fun_dates.hr,
-    'mins': tab_fun_dates.mins,
-    'secs': tab_fun_dates.secs,
-    'pi': tab_fun_maths.PI,
-    'tau': tab_fun_maths.TAU,
-    'cos': tab_fun_maths.cos, 'cosd': tab_fun_maths.cosd,
-    'tan': tab_fun_maths.cos, 'tand': tab_fun_maths.tand,
-    'hex': tab_fun_maths.decimal_to_hex,
-    'oct': tab_fun_maths.decimal_to_oct,
-    'factors': tab_fun_maths.factors,
-    'hypot': tab_fun_maths.pyth_add,
-    'sin': tab_fun_maths.sin, 'sind': tab_fun_maths.sind,
-    'len': tab_fun_useful.length,
-    'all': tab_fun_useful.t_all,
-    'any': tab_fun_useful.t_any,
-    'max': tab_fun_useful.t_max,
-    'min': tab_fun_useful.t_min,
-    'minp': tab_fun_useful.t_minp,
-    'sorted': tab_fun_useful.t_sorted,
-    'sum': tab_fun_useful.t_sum,
-    'Decimal': decimal.Decimal,
-    '__builtins__': {},
-}
+
+# Everything else is imported where it is used, so that we do not pay for it
+# when we just want to line up a table.  Python only loads each module once.
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    "Import NumPy for the optional engine when we first need it, or None if it is not installed"
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+@functools.lru_cache(maxsize=None)
+def _big_cats():
+    '''Make Panther and Cheetah, the first time we need to work out an expression'''
+    import random
+    import tab_fun_dates
+    import tab_fun_maths
+    import tab_fun_useful
+
+    # Panther is a big cat of functions for column maths, using the Decimal
+    # versions.  This is used to limit the scope of the `eval` function when
+    # evaluating expressions in DSL options.  So if you are calculating a new
+    # column value with arr, or sorting on a calculated value etc, you can only use
+    # the functions in this dictionary.  The idea is that the keys are what you the
+    # user types and the values are the names of actual functions, either built-in
+    # or provided by the helper modules.
+
+    panther = {
+        'abs': builtins.abs,
+        'bool': builtins.bool,
+        'chr': builtins.chr,
+        'divmod': builtins.divmod,
+        'format': builtins.format,
+        'int': builtins.int,
+        'ord': builtins.ord,
+        'pow': builtins.pow,
+        'round': builtins.round,
+        'str': builtins.str,
+        'reversed': lambda x: ''.join(reversed(x)),
+        'exp': lambda x: decimal.Decimal(x).exp(),
+        'log': lambda x: decimal.Decimal(x).ln(),
+        'log10': lambda x: decimal.Decimal(x).log10(),
+        'sqrt': lambda x: decimal.Decimal(x).sqrt(),
+        'caps': lambda x: str(x).capitalize(),
+        'lower': lambda x: str(x).lower(),
+        'upper': lambda x: str(x).upper(),
+        'randomd': lambda: decimal.Decimal(str(random.random())),
+        'mlog': tab_fun_maths.mlog,
+        'mexp': tab_fun_maths.mexp,
+        'angle': tab_fun_maths.angle,
+        'dir': tab_fun_maths.dir,
+        'floor': math.floor,
+        'time': tab_fun_dates.as_time,
+        'base': tab_fun_dates.base,
+        'date': tab_fun_dates.date,
+        'dow': tab_fun_dates.dow,
+        'epoch': tab_fun_dates.epoch,
+        'hms': tab_fun_dates.hms,
+        'hr': tab_fun_dates.hr,
+        'mins': tab_fun_dates.mins,
+        'secs': tab_fun_dates.secs,
+        'pi': tab_fun_maths.PI,
+        'tau': tab_fun_maths.TAU,
+        'cos': tab_fun_maths.cos, 'cosd': tab_fun_maths.cosd,
+        'tan': tab_fun_maths.cos, 'tand': tab_fun_maths.tand,
+        'hex': tab_fun_maths.decimal_to_hex,
+        'oct': tab_fun_maths.decimal_to_oct,
+        'factors': tab_fun_maths.factors,
+        'hypot': tab_fun_maths.pyth_add,
+        'sin': tab_fun_maths.sin, 'sind': tab_fun_maths.sind,
+        'len': tab_fun_useful.length,
+        'all': tab_fun_useful.t_all,
+        'any': tab_fun_useful.t_any,
+        'max': tab_fun_useful.t_max,
+        'min': tab_fun_useful.t_min,
+        'minp': tab_fun_useful.t_minp,
+        'sorted': tab_fun_useful.t_sorted,
+        'sum': tab_fun_useful.t_sum,
+        'Decimal': decimal.Decimal,
+        '__builtins__': {},
+    }
+
+    # Cheetah is the faster cat, used when a Table is in "float" numeric mode.
+    # It is Panther with the Decimal functions replaced by float versions, so
+    # that they can be mixed with the ints and floats produced by is_as_float.
+
+    cheetah = dict(
+        panther,
+        exp=math.exp,
+        log=math.log,
+        log10=math.log10,
+        sqrt=math.sqrt,
+        randomd=random.random,
+        mlog=lambda x: 256 * math.log(x),
+        mexp=lambda x: math.exp(x / 256),
+        angle=lambda a, b: math.degrees(math.atan2(b, a)),
+        dir=lambda t: (math.cos(math.radians(t)), math.sin(math.radians(t))),
+        pi=math.pi,
+        tau=math.tau,
+        cos=math.cos, cosd=lambda x: math.cos(math.radians(x)),
+        tan=math.tan, tand=lambda x: math.tan(math.radians(x)),
+        sin=math.sin, sind=lambda x: math.sin(math.radians(x)),
+        hypot=math.hypot,
+        Decimal=float,
+    )
+    return panther, cheetah
+
+
+def __getattr__(name):
+    "Make the module attributes that are slow to set up when someone first asks for them (PEP 562)"
+    if name == 'numpy':
+        return _numpy()
+    if name == 'Panther':
+        return _big_cats()[0]
+    if name == 'Cheetah':
+        return _big_cats()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # various number utils at this level
 
@@ -159,6 +212,7 @@ def as_numeric_tuple(x, backwards=False):
     except ValueError:
         pass
 
+    import tab_fun_dates
     try:
         return (int(tab_fun_dates.parse_date(x).strftime("%s")), x)
     except ValueError:
@@ -196,6 +250,7 @@ def as_numeric_tuple(x, backwards=False):
     return (alpha, x)
 
 
+@functools.lru_cache(maxsize=65536)
 def is_as_number(sss):
     '''Input (string) Output (boolean, any)
     if boolean is True, any is int or Decimal
@@ -229,24 +284,13 @@ def is_as_number(sss):
     >>> is_as_number('14¾')
     (True, Decimal('14.75'))
     '''
-    digits = '1234567890'
-    ignore = '£$,_'
-    signs = '+-'
-    point = '.'
-    alphabetics = 'xoabcdef'
-    suffix = '%¼½¾'
-
     if sss in ('True', 'False'):
         return (True, sss == 'True')
 
-    if not all((c in digits + point + signs + ignore + alphabetics + suffix) for c in sss.lower()):
-        return (False, sss)
-
-    if not any((c in digits) for c in sss):
+    trial_number = _trial_number(sss)
+    if trial_number is None:
         return (False, sss)
 
-    trial_number = ''.join(c for c in sss.lower() if c in digits + point + signs + alphabetics + suffix)
-
     try:
         return (True, decimal.Decimal(int(trial_number, 0)))
     except (ValueError, SyntaxError):
@@ -255,8 +299,8 @@ def is_as_number(sss):
     try:
         if trial_number.endswith('%'):
             return (True, decimal.Decimal(trial_number[:-1]) / 100)
-        if trial_number[-1] in suffix:
-            return (True, decimal.Decimal(trial_number[:-1]) + decimal.Decimal(suffix.index(trial_number[-1])) / 4)
+        if trial_number[-1] in NUMBER_SUFFIXES:
+            return (True, decimal.Decimal(trial_number[:-1]) + decimal.Decimal(NUMBER_SUFFIXES.index(trial_number[-1])) / 4)
         return (True, decimal.Decimal(trial_number))
     except ArithmeticError:
         pass
@@ -264,6 +308,78 @@ def is_as_number(sss):
     return (False, sss)
 
 
+@functools.lru_cache(maxsize=65536)
+def is_as_float(sss):
+    '''Input (string) Output (boolean, any)
+    The same as is_as_number, except that any is an int or a float
+    >>> is_as_float("Label")
+    (False, 'Label')
+    >>> is_as_float("False")
+    (True, False)
+    >>> is_as_float("3.14")
+    (True, 3.14)
+    >>> is_as_float('0x4F')
+    (True, 79)
+    >>> is_as_float('1,234,567')
+    (True, 1234567)
+    >>> is_as_float('43%')
+    (True, 0.43)
+    >>> is_as_float('£34.00')
+    (True, 34.0)
+    >>> is_as_float('14¾')
+    (True, 14.75)
+    >>> is_as_float('0x40.0')
+    (False, '0x40.0')
+    '''
+    if sss in ('True', 'False'):
+        return (True, sss == 'True')
+
+    trial_number = _trial_number(sss)
+    if trial_number is None:
+        return (False, sss)
+
+    try:
+        return (True, int(trial_number, 0))
+    except (ValueError, SyntaxError):
+        pass
+
+    try:
+        if trial_number.endswith('%'):
+            return (True, float(trial_number[:-1]) / 100)
+        if trial_number[-1] in NUMBER_SUFFIXES:
+            return (True, float(trial_number[:-1]) + NUMBER_SUFFIXES.index(trial_number[-1]) / 4)
+        return (True, float(trial_number))
+    except ValueError:
+        pass
+
+    return (False, sss)
+
+
+NUMBER_SUFFIXES = '%¼½¾'
+
+
+def _trial_number(sss):
+    '''Strip out currency signs and separators, if sss might be a number,
+    otherwise return None
+    >>> _trial_number('£1,234.00')
+    '1234.00'
+    >>> _trial_number('Label')
+    '''
+    digits = '1234567890'
+    ignore = '£$,_'
+    signs = '+-'
+    point = '.'
+    alphabetics = 'xoabcdef'
+
+    if not all((c in digits + point + signs + ignore + alphabetics + NUMBER_SUFFIXES) for c in sss.lower()):
+        return None
+
+    if not any((c in digits) for c in sss):
+        return None
+
+    return ''.join(c for c in sss.lower() if c in digits + point + signs + alphabetics + NUMBER_SUFFIXES)
+
+
 def as_decimal(n, na_value=decimal.Decimal('0')):
     "Make this a decimal"
     try:
@@ -274,6 +390,27 @@ def as_decimal(n, na_value=decimal.Decimal('0')):
         return na_value
 
 
+def as_float(n, na_value=0.0):
+    "Make this a float"
+    try:
+        return float(n)
+    except (TypeError, ValueError):
+        return na_value
+
+
+def as_text(x):
+    '''Make a cell value from a calculated float, showing the
+    same 12 significant figures that we use for Decimals
+    >>> as_text(0.1 + 0.2)
+    '0.3'
+    >>> as_text(42)
+    '42'
+    '''
+    if isinstance(x, float):
+        return _format_float(x)
+    return str(x)
+
+
 def siggy(s, n):
     '''Reduce to n sig figs
     >>> siggy('1,234', 2)
@@ -366,7 +503,25 @@ def looks_like_formula(expression):
     return False
 
 
-def compile_as_decimal(expr):
+def _sweeten(expr):
+    '''Apply the syntactic sugar allowed in DSL expressions
+
+    >>> _sweeten('a<>b')
+    'a!=b'
+    >>> _sweeten('a mod 3 = 1')
+    'a % 3 == 1'
+    >>> _sweeten('a++b')
+    'hypot(a,b)'
+    '''
+    clean_expression = expr.replace('<>', '!=')
+    clean_expression = re.sub(r'\bmod\b', '%', clean_expression)
+    clean_expression = re.sub(r'([a-z])\s*[+][+]\s*([a-z])', r'hypot(\1,\2)', clean_expression)
+    clean_expression = re.sub(r'(?<![<>!])=+', '==', clean_expression)  # also allow a=b
+    return clean_expression
+
+
+@functools.lru_cache(maxsize=256)
+def compile_as_decimal(expr, decimals=True):
     '''This function takes as expression given as an argument to
     one of the verbs like arr or filter or sort or tap, and compiles
     it so that we can execute it more efficiently.
@@ -385,15 +540,14 @@ def compile_as_decimal(expr):
 
     Finally we untokenize the expression and compile it with the compile BIF.
 
+    If decimals is False, the number literals are left alone, for use in "float" mode.
     '''
-    clean_expression = expr.replace('<>', '!=')
-    clean_expression = re.sub(r'\bmod\b', '%', clean_expression)
-    clean_expression = re.sub(r'([a-z])\s*[+][+]\s*([a-z])', r'hypot(\1,\2)', clean_expression)
-    clean_expression = re.sub(r'(?<![<>!])=+', '==', clean_expression)  # also allow a=b
+    import tokenize
+    clean_expression = _sweeten(expr)
     out = []
     try:
         for tn, tv, _, _, _ in tokenize.generate_tokens(io.StringIO(clean_expression).readline):
-            if tn == tokenize.NUMBER and ('.' in tv or 'e' in tv.lower()):
+            if decimals and tn == tokenize.NUMBER and ('.' in tv or 'e' in tv.lower()):
                 out.append((tokenize.NAME, 'Decimal'))
                 out.append((tokenize.OP, '('))
                 out.append((tokenize.STRING, repr(tv)))
@@ -415,6 +569,305 @@ def compile_as_decimal(expr):
     return (True, cc)
 
 
+# The optional NumPy engine only understands whole-column arithmetic
+# with a handful of functions; anything else goes down the Decimal path.
+NUMPY_FUNCTIONS = ('sqrt', 'log', 'exp', 'sin', 'cos')
+NUMPY_NODES = (
+    'Expression', 'BinOp', 'UnaryOp', 'Call', 'Name', 'Load',
+    'Add', 'Sub', 'Mult', 'Div', 'Pow', 'UAdd', 'USub',
+)
+
+
+def compile_as_numpy(expr):
+    '''Compile an expression for the optional NumPy engine.
+
+    The same syntactic sugar is applied as in compile_as_decimal, then we
+    parse the expression and check that every node is something that NumPy
+    can do to a whole float64 column at once.  Numeric literals are left
+    as they are, because the engine works in floats not Decimals.
+
+    >>> compile_as_numpy('(a+b)/2')[0]
+    True
+    >>> compile_as_numpy('sqrt(a*a + b**2)')[0]
+    True
+    >>> compile_as_numpy('a > 2')
+    (False, 'not vectorizable a > 2')
+    >>> compile_as_numpy('upper(a)')
+    (False, 'not vectorizable upper(a)')
+    >>> compile_as_numpy('?')
+    (False, '?! syntax ?')
+    '''
+    import ast
+    try:
+        tree = ast.parse(_sweeten(expr), mode='eval')
+    except SyntaxError:
+        return (False, '?! syntax ' + expr)
+
+    # Python 3.7 parses a number as a Num node, with the value in n
+    literal, value = (ast.Constant, 'value') if sys.version_info >= (3, 8) else (ast.Num, 'n')
+    allowed = tuple(getattr(ast, name) for name in NUMPY_NODES) + (literal,)
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed):
+            return (False, 'not vectorizable ' + expr)
+        if isinstance(node, literal):
+            number = getattr(node, value)
+            if isinstance(number, bool) or not isinstance(number, (int, float)):
+                return (False, 'not vectorizable ' + expr)
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in NUMPY_FUNCTIONS:
+                return (False, 'not vectorizable ' + expr)
+            if len(node.args) != 1 or node.keywords:
+                return (False, 'not vectorizable ' + expr)
+
+    return (True, compile(tree, '<string>', 'eval'))
+
+
+def _format_float(x):
+    '''Show a float from the NumPy engine with the same 12 significant
+    figures that we use in the Decimal context
+
+    >>> _format_float(6.0)
+    '6'
+    >>> _format_float(1/3)
+    '0.333333333333'
+    >>> _format_float(float('inf'))
+    '-'
+    '''
+    if not math.isfinite(x):
+        return '-'
+    return f'{x:.12g}'
+
+
+def _x_first(fstring):
+    '''If there is no x in a tap function, add one to the front, so that
+    you can write things like "+1" or "/4"
+
+    >>> _x_first('/4')
+    'x/4'
+    >>> _x_first('2**x')
+    '2**x'
+    '''
+    if "x" not in fstring and fstring[0] in ('*', '/', '+', '-', '<', '>', '='):
+        return "x" + fstring
+    return fstring
+
+
+def _squeeze(row, joiner):
+    '''Remove spaces from the values in a row, for nospace
+
+    >>> _squeeze(['New York', 'big apple'], '-')
+    ['New-York', 'big-apple']
+    >>> _squeeze(['New York', 'big apple'], '')
+    ['NewYork', 'BigApple']
+    '''
+    if joiner:
+        return [joiner.join(cell.split()) for cell in row]
+    return [''.join(cell.title().split()) for cell in row]
+
+
+def _sort_key(c, backwards=False):
+    '''Make a sort key function for column c that works out as_numeric_tuple
+    only once for each different value in the column, which is a big saving
+    for columns with lots of repeats, like names or dates.
+
+    >>> key = _sort_key(1)
+    >>> sorted([['a', '10'], ['b', '9'], ['c', '10']], key=key)
+    [['b', '9'], ['a', '10'], ['c', '10']]
+    >>> len(key.cache)
+    2
+    '''
+    cache = {}
+
+    def key(row):
+        try:
+            return cache[row[c]]
+        except KeyError:
+            t = cache[row[c]] = as_numeric_tuple(row[c], backwards)
+            return t
+
+    key.cache = cache
+    return key
+
+
+COMPARISONS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+
+
+def _simple_comparison(expression):
+    '''If a filter expression just compares a column with a whole number, return
+    the column letter, the comparison function, and the number, otherwise None
+
+    >>> c, f, n = _simple_comparison('b >= 10')
+    >>> c, f(12, n), f(9, n)
+    ('b', True, False)
+    >>> _simple_comparison('a<>-3')[::2]
+    ('a', -3)
+    >>> _simple_comparison('b > c')
+    >>> _simple_comparison('b > 3.5')
+    '''
+    m = re.match(r'\s*([a-z])\s*([<>!=]=?|<>)\s*([-+]?\d+)\s*\Z', _sweeten(expression))
+    if m is None or m.group(2) not in COMPARISONS:
+        return None
+    return m.group(1), COMPARISONS[m.group(2)], int(m.group(3))
+
+
+def _peek_width(items):
+    '''Look ahead in a stream of items to find the width of the first row.
+    Returns the width and an iterator that will give all the items again.
+
+    >>> w, items = _peek_width(iter(['rule', ['a', 'b'], ['c']]))
+    >>> w, list(items)
+    (2, ['rule', ['a', 'b'], ['c']])
+    '''
+    seen = []
+    for item in items:
+        seen.append(item)
+        if not isinstance(item, str):
+            return len(item), itertools.chain(seen, items)
+    return 0, iter(seen)
+
+
+def _head_count(n_spec):
+    '''How many rows does head want to keep?  Default 10, plus one for @
+
+    >>> _head_count('')
+    10
+    >>> _head_count('@5')
+    6
+    >>> _head_count('0')
+    0
+    '''
+    spec = n_spec.replace('@', '')
+    return (int(spec) if spec.isdigit() else 10) + ('@' in n_spec)
+
+
+def _reservoir(rows, n, rng=None):
+    '''Pick n rows at random from an iterable in one pass, keeping them in order
+    (this is Knuth's "Algorithm R" from TAOCP 3.4.2)
+
+    >>> _reservoir(range(5), 10)
+    [0, 1, 2, 3, 4]
+    >>> len(_reservoir(range(1000), 10))
+    10
+    >>> import random
+    >>> _reservoir(range(1000), 3, random.Random(42))
+    [538, 562, 989]
+    '''
+    if rng is None:
+        import random
+        rng = random
+    chosen = []
+    for i, row in enumerate(rows):
+        if i < n:
+            chosen.append((i, row))
+        else:
+            j = rng.randrange(i + 1)
+            if j < n:
+                chosen[j] = (i, row)
+    return list(row for _, row in sorted(chosen, key=lambda pair: pair[0]))
+
+
+def _sample_spec(spec):
+    '''Get the size, a random generator, and the header flag from the argument for sample
+
+    >>> _sample_spec('@5 42')[::2]
+    (5, True)
+    >>> _sample_spec('')[::2]
+    (10, False)
+    '''
+    import random
+    words = spec.replace('@', ' ').split()
+    n = int(words[0]) if words and words[0].isdigit() else 10
+    rng = random.Random(words[1]) if len(words) > 1 else random
+    return n, rng, '@' in spec
+
+
+def _peek_lines(lines_thing, n=1):
+    '''Look at the first few lines of an iterable thing, without using them up.
+    Returns the sample and an iterator that will give all the lines again.
+
+    >>> sample, lines = _peek_lines(iter(['one', 'two', 'three']))
+    >>> sample, list(lines)
+    (['one'], ['one', 'two', 'three'])
+    '''
+    lines = iter(lines_thing)
+    sample = list(itertools.islice(lines, n))
+    return sample, itertools.chain(sample, lines)
+
+
+def edit_script(old_lines, new_lines, style='ed'):
+    '''Generate the lines of an edit script that turns old_lines into new_lines,
+    either as ed commands (like "diff -e"), or as a unified diff.
+
+    >>> list(edit_script(['a', 'b', 'c', 'd'], ['a', 'B', 'c', 'd', 'e']))
+    ['4a', 'e', '.', '2c', 'B', '.']
+    >>> list(edit_script(['a', 'b', 'c'], ['c']))
+    ['1,2d']
+    >>> list(edit_script(['a', 'b'], ['a', 'b']))
+    []
+    '''
+    import difflib
+    if style == 'unified':
+        yield from difflib.unified_diff(old_lines, new_lines, 'input', 'output', lineterm='')
+        return
+
+    # ed commands go from the bottom up, so that the line numbers stay right
+    opcodes = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes()
+    for tag, i1, i2, j1, j2 in reversed(opcodes):
+        where = f'{i1 + 1}' if i2 - i1 == 1 else f'{i1 + 1},{i2}'
+        if tag == 'delete':
+            yield where + 'd'
+        elif tag == 'replace':
+            yield where + 'c'
+            yield from new_lines[j1:j2]
+            yield '.'
+        elif tag == 'insert':
+            yield f'{i1}a'
+            yield from new_lines[j1:j2]
+            yield '.'
+
+
+def _sniff_source(delim, sample):
+    '''Work out what sort of input we have, from the delimiter given on the command
+    line (if any) and a sample of the first few lines.  Returns the source type, which is
+    one of tex, latex, csv, or lines, and for lines the splitter and the maxsplit.
+
+    >>> _sniff_source(None, ['a & b \\\\cr'])
+    ('tex', None, 0)
+    >>> _sniff_source('.3', [])
+    ('lines', re.compile('\\\\s{2,}'), 3)
+    >>> _sniff_source(':', [])
+    ('lines', re.compile(':'), 0)
+    '''
+    if delim is None:
+        first_line = sample[0].strip() if sample else ''
+        # guess delim from content: tex & latex & pipe |
+        if first_line.count('&') > 0 and first_line.endswith("\\cr"):
+            return ('tex', None, 0)
+        if first_line.count('&') > 0 and first_line.endswith("\\\\"):
+            return ('latex', None, 0)
+        if first_line.count('|') > 2:
+            return ('lines', re.compile(r'\s*\|\s*'), 0)
+        return ('lines', re.compile(r'\s{2,}'), 0)
+
+    if delim == ',':
+        return ('csv', None, 0)
+
+    # check for a maxsplit spec ".3", "2.4" etc
+    cell_limit = 0
+    mm = re.match(r'(\d*)\.(\d+)', delim)
+    if mm is not None:
+        delim = mm.group(1)
+        if delim == '':
+            delim = '2'
+        cell_limit = int(mm.group(2))
+    if delim.isdigit():
+        return ('lines', re.compile(rf'\s{{{delim},}}'), cell_limit)
+    return ('lines', re.compile(re.escape(delim)), cell_limit)
+
+
 def _replace_values(failed_expression, known_variables):
     '''replace the variables that we know about in the expression
     This is used when an eval fails.  The idea is that we replace the value
@@ -430,6 +883,7 @@ def _replace_values(failed_expression, known_variables):
     >>> _replace_values("(s/x)", {'s': 'ex', 'x': 'hide_this'})
     'ex/hide_this'
     '''
+    import tokenize
     out = []
     for tn, tv, _, _, _ in tokenize.generate_tokens(io.StringIO(failed_expression).readline):
         if tn == tokenize.NAME and tv in known_variables:
@@ -491,6 +945,7 @@ def statistical_summary(numbers):
     if not numbers:
         return ''
 
+    import statistics
     me = statistics.mean(numbers)
     if len(numbers) > 10:
         mi, lq, md, uq, ma = quantiles(numbers)
@@ -516,29 +971,254 @@ def counting_summary(factors, n=5):
     return analysis
 
 
+class Extras:
+    '''The special rows (blanks, rules, and comments) in a table, kept as a sparse
+    mapping from the index of the row they come before to a set of markers.
+    Looking up an index with no markers gives an empty frozenset, without storing anything.
+
+    >>> e = Extras()
+    >>> e.add(3, 'rule')
+    >>> e.add(7, 'blank')
+    >>> e[3], e[4], list(e)
+    ({'rule'}, frozenset(), [3, 7])
+    >>> e.pop(3), list(e.items())
+    ({'rule'}, [(7, {'blank'})])
+    '''
+    EMPTY = frozenset()
+
+    def __init__(self):
+        self._keys = []  # sorted row indexes that have markers
+        self._markers = {}
+
+    def __getitem__(self, i):
+        return self._markers.get(i, self.EMPTY)
+
+    def __contains__(self, i):
+        return i in self._markers
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def items(self):
+        "Generate (index, markers) pairs in order"
+        return ((k, self._markers[k]) for k in self._keys)
+
+    def add(self, i, marker):
+        "Add a marker in front of row i"
+        self.update(i, (marker,))
+
+    def update(self, i, markers):
+        "Add some markers in front of row i"
+        if not markers:
+            return
+        if i not in self._markers:
+            bisect.insort(self._keys, i)
+            self._markers[i] = set()
+        self._markers[i].update(markers)
+
+    def discard(self, i, marker):
+        "Remove a marker from in front of row i, if it is there"
+        if marker in self[i]:
+            self._markers[i].discard(marker)
+            if not self._markers[i]:
+                self.pop(i)
+
+    def pop(self, i, default=None):
+        "Remove and return the markers in front of row i"
+        if i not in self._markers:
+            return default
+        del self._keys[bisect.bisect_left(self._keys, i)]
+        return self._markers.pop(i)
+
+    def clear(self):
+        "Remove all the markers"
+        self._keys.clear()
+        self._markers.clear()
+
+    def copy(self):
+        "A copy with its own sets"
+        other = Extras()
+        other._keys = self._keys[:]
+        other._markers = {k: set(v) for k, v in self._markers.items()}
+        return other
+
+
+class SQLiteMirror:
+    '''A copy of the rows of a table in an in-memory SQLite database, for the sqlite engine.
+    The Python rows stay where they are, and the database just has the current order of the
+    rows, and a code for the value of each cell in each column that we have needed so far,
+    so the verbs hand back the same rows in a new order.  The columns, and the sort ranks
+    for the different values in each column, are kept with their indexes for any later
+    verbs in the same agenda.
+
+    >>> m = SQLiteMirror([['b', '10'], ['a', '9'], ['b', '2']])
+    >>> m.sort([(0, False), (1, True)])
+    [['a', '9'], ['b', '10'], ['b', '2']]
+    >>> m.uniq([0])
+    [['a', '9'], ['b', '10']]
+    >>> m.select(1, lambda v: int(v) > 9)
+    [False, True]
+    >>> m.order
+    [['b', '10']]
+    '''
+    def __init__(self, rows):
+        import sqlite3
+        self.rows = rows[:]  # the rows, by id
+        self.order = rows[:]  # the rows, in their current order
+        self.tables = set()
+        self._cache = {}
+        self.db = sqlite3.connect(':memory:')
+        # deterministic lets SQLite treat the keys as pure, but only 3.8 and later know about it
+        pure = {'deterministic': True} if sys.version_info >= (3, 8) else {}
+        self.db.create_function('sort_number', 2, lambda x, b: self._sort_key(x, b)[0], **pure)
+        self.db.create_function('sort_text', 2, lambda x, b: self._sort_key(x, b)[1], **pure)
+        self.db.execute('CREATE TABLE o (pos INTEGER PRIMARY KEY, id INTEGER)')
+        self.db.executemany('INSERT INTO o VALUES (?, ?)', ((i, i) for i in range(len(rows))))
+
+    def _sort_key(self, x, backwards):
+        "as_numeric_tuple, once for each value"
+        try:
+            return self._cache[x, backwards]
+        except KeyError:
+            t = self._cache[x, backwards] = as_numeric_tuple(x, backwards)
+            return t
+
+    def _column(self, c):
+        '''Load column c, unless we already have it, as a table of the different values
+        v{c} and a table of the value code for each row c{c}, and return its name'''
+        name = f'c{c}'
+        if name not in self.tables:
+            codes = {}
+            self.db.execute(f'CREATE TABLE {name} (id INTEGER PRIMARY KEY, code INTEGER)')
+            self.db.executemany(f'INSERT INTO {name} VALUES (?, ?)',
+                                ((i, codes.setdefault(r[c], len(codes))) for i, r in enumerate(self.rows)))
+            self.db.execute(f'CREATE TABLE v{c} (code INTEGER PRIMARY KEY, value TEXT)')
+            self.db.executemany(f'INSERT INTO v{c} VALUES (?, ?)', ((k, v) for v, k in codes.items()))
+            self.tables.add(name)
+        return name
+
+    def _ranks(self, c, backwards):
+        '''Make the table of sort ranks for each different value in column c, unless we
+        have already made it, and return its name'''
+        name = f'r{c}{"b" if backwards else "f"}'
+        if name not in self.tables:
+            self._column(c)
+            b = int(backwards)
+            self.db.execute(f'CREATE TABLE {name} (code INTEGER PRIMARY KEY, rank INTEGER)')
+            self.db.execute(f'''INSERT INTO {name} SELECT code, DENSE_RANK() OVER (ORDER BY n, s)
+                FROM (SELECT code, sort_number(value, {b}) AS n, sort_text(value, {b}) AS s FROM v{c})''')
+            self.tables.add(name)
+        return name
+
+    def _reorder(self, query):
+        "Put the rows in the order given by a query for their ids, and return them"
+        self.db.execute('CREATE TABLE o2 (pos INTEGER PRIMARY KEY, id INTEGER)')
+        self.db.execute(f'INSERT INTO o2 (id) {query}')
+        self.db.execute('DROP TABLE o')
+        self.db.execute('ALTER TABLE o2 RENAME TO o')
+        self.order = list(self.rows[i] for (i,) in self.db.execute('SELECT id FROM o ORDER BY pos'))
+        return self.order
+
+    def sort(self, columns):
+        '''Sort the rows on a list of (column, reverse) pairs, the first one first, keeping
+        rows with the same keys in their current order, and return them'''
+        joins, order = {}, []
+        for c, backwards in columns:
+            column, ranks = self._column(c), self._ranks(c, backwards)
+            joins[column] = f'JOIN {column} USING (id)'
+            joins[ranks] = f'JOIN {ranks} ON {ranks}.code = {column}.code'
+            order.append(f'{ranks}.rank' + (' DESC' if backwards else ''))
+        return self._reorder(f'SELECT o.id FROM o {" ".join(joins.values())} ORDER BY {", ".join(order)}, o.pos')
+
+    def uniq(self, columns):
+        '''Remove each row whose cells in the given columns (joined up with spaces) match the
+        row above, and return the rest'''
+        joins = {}
+        for c in columns:
+            column = self._column(c)
+            joins[column] = f'JOIN {column} USING (id)'
+            if len(columns) > 1:
+                joins[f'v{c}'] = f'JOIN v{c} ON v{c}.code = {column}.code'
+        if len(columns) == 1:
+            # compare the codes, and an empty first cell has to match the empty "row above" the first row
+            this, first = f'c{columns[0]}.code', f"(SELECT code FROM v{columns[0]} WHERE value = '')"
+        else:
+            this, first = " || ' ' || ".join(f'v{c}.value' for c in columns), "''"
+        return self._reorder(f'''SELECT id FROM (SELECT o.pos, o.id, {this} AS this,
+            LAG({this}, 1, {first}) OVER (ORDER BY o.pos) AS previous FROM o {" ".join(joins.values())})
+            WHERE this IS NOT previous ORDER BY pos''')
+
+    def select(self, c, wanted):
+        '''Ask wanted about each different value in column c, keep the rows it likes,
+        and return a list of flags for the rows as they were'''
+        column = self._column(c)
+        self.db.create_function('wanted', 1, lambda x: bool(wanted(x)))
+        self.db.execute(f'''CREATE TEMP TABLE w AS SELECT code, wanted(value) AS ok FROM v{c}
+            WHERE code IN (SELECT DISTINCT code FROM o JOIN {column} USING (id))''')
+        try:
+            self.db.execute('CREATE UNIQUE INDEX w_code ON w (code)')
+            flags = list(bool(ok) for (ok,) in self.db.execute(
+                f'SELECT w.ok FROM o JOIN {column} USING (id) JOIN w USING (code) ORDER BY o.pos'))
+            self._reorder(f'SELECT o.id FROM o JOIN {column} USING (id) JOIN w USING (code) WHERE w.ok ORDER BY o.pos')
+        finally:
+            self.db.execute('DROP TABLE w')
+        return flags
+
+
 class Table:
     '''A class to hold a table -- and some functions thereon'''
 
-    def __init__(self):
+    distinct_values = 65536  # the most values to keep for each column in the dictionaries used by _intern
+
+    def __init__(self, engine='decimal', numeric='decimal', optimize=False, history=0):
         " empty data and no rows or cols "
-        decimal.getcontext().prec = 12
+        self.engine = engine
+        self.optimize = optimize
+        self.numeric = numeric
+        self.history = history  # how many steps undo can go back, beyond the current agenda
+        if numeric == 'float':
+            self._number, self._as_number, self._text = is_as_float, as_float, as_text
+            self._total = math.fsum
+        else:
+            decimal.getcontext().prec = 12
+            self._number, self._as_number, self._text = is_as_number, as_decimal, str
+            self._total = builtins.sum
         self.data = []
         self.cols = 0
         self.indent = 0
-        self.extras = collections.defaultdict(set)
+        self.extras = Extras()
         self.form = 'plain'
         self.messages = []
         self.stack = []  # used to cache popped items
+        self._past = collections.deque()  # snapshots for undo, the latest at the right
+        self._future = []  # snapshots for redo
+        self._depth = 0  # how many agendas are being done, since some verbs call do themselves
+        # column widths and counts of numbers, kept up to date by insert once they have been measured
+        self._widths = []
+        self._numbers = []
+        self._measured = None  # how many rows have been counted, or None if we need to start again
+        self._spill = None  # a binary file for rows that we do not keep in memory
+        self._values = []  # one shared copy of each cell value, for each column, see _intern
+        self._typed = {}  # compact arrays of numeric columns, see typed_column
+        self._typed_rows = []  # the rows that the arrays in _typed were made from, in order
+        self._mirror = None  # the rows in SQLite for the sqlite engine, during an agenda
+        self.named_tables = {}  # other tables (or lists of rows) that join can use by name
         self.operations = {
             'add': self._append_reduction,
             'arr': self._rearrange_columns,
             'ditto': self._copy_down,
             'dp': self._fix_decimal_places,
             'dup': self._duplicate_item,
+            'explain': self._explain_agenda,
             'filter': self._select_matching_rows,
             'gen': self._generate_new_rows,
             'group': self._add_grouping_blanks,
+            'head': self._keep_first_rows,
             'help': self._describe_operations,
+            'join': self._join_tables,
             'make': self._set_output_form,
             'label': self._label_columns,
             'levels': self._show_column_counts,
@@ -546,13 +1226,16 @@ class Table:
             'noblanks': self._remove_blank_extras,
             'pivot': self._wrangle,
             'pop': self.pop,
+            'redo': self._step_forward,
             'push': self.push,
             'roll': self._roll_by_col,
             'rule': self.add_rule,
             'tap': self._apply_function_to_numeric_values,
             'sf': self._fix_sigfigs,
+            'sample': self._sample_rows,
             'shuffle': self._shuffle_rows,
             'sort': self._sort_rows_by_col,
+            'undo': self._step_back,
             'uniq': self._remove_duplicates_by_col,
             'unwrap': self._unrapper,
             'unzip': self._unzipper,
@@ -560,6 +1243,18 @@ class Table:
             'xp': self.transpose,
             'zip': self._zipper,
         }
+        # row-local verbs that can be done as the table is read
+        self.streams = {
+            'arr': self._stream_arr,
+            'ditto': self._stream_ditto,
+            'dp': self._stream_dp,
+            'filter': self._stream_filter,
+            'head': self._stream_head,
+            'nospace': self._stream_nospace,
+            'sample': self._stream_sample,
+            'sf': self._stream_sf,
+            'tap': self._stream_tap,
+        }
 
     def __str__(self):
         "Print neatly"
@@ -576,10 +1271,17 @@ class Table:
         "Also like a list..."
         return len(self.data)
 
+    @property
+    def _functions(self):
+        "The functions for expressions: Cheetah in float mode, otherwise Panther"
+        panther, cheetah = _big_cats()
+        return cheetah if self.numeric == 'float' else panther
+
     def _describe_operations(self, dsl_verb=''):
         '''What commands are defined?'''
+        import textwrap
         if dsl_verb.lower() == 'arr':
-            verbs = sorted(x for x in Panther if x[0] in string.ascii_lowercase)
+            verbs = sorted(x for x in self._functions if x[0] in string.ascii_lowercase)
             msg = f'Functions for arr: {" ".join(verbs)}'
         else:
             msg = f'Try one of these: {" ".join(sorted(self.operations))}'
@@ -589,8 +1291,51 @@ class Table:
         "Clear data etc"
         self.data.clear()
         self.extras.clear()
+        self._values.clear()
+        self._typed.clear()
         self.cols = 0
         self.indent = 0
+        self._measured = None
+        if self._spill is not None:
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spilled = 0
+            self._widths = []
+            self._numbers = []
+            self._present = []  # how many rows have a value in each column
+
+    def _snapshot(self):
+        '''Save the state of the table for undo.  The rows are saved as tuples, and any row
+        that has not changed since the last snapshot shares the tuple saved then, so each
+        snapshot only costs a pointer for each row, plus the rows that are new.
+        '''
+        previous = {row: row for row in self._past[-1][0]} if self._past else {}
+        rows = tuple(previous.get(row, row) for row in map(tuple, self.data))
+        return (rows, self.cols, self.extras.copy(), self.form)
+
+    def _restore(self, snapshot):
+        "Put the table back as it was when the snapshot was taken"
+        rows, self.cols, extras, self.form = snapshot
+        self.data = list(list(row) for row in rows)
+        self.extras = extras.copy()
+        self._measured = None
+        self._typed.clear()
+
+    def _step_back(self, n):
+        "Undo the last n verbs (default 1)"
+        for _ in range(int(n) if n.isdigit() else 1):
+            if not self._past:
+                break
+            self._future.append(self._snapshot())
+            self._restore(self._past.pop())
+
+    def _step_forward(self, n):
+        "Redo the last n verbs that were undone (default 1)"
+        for _ in range(int(n) if n.isdigit() else 1):
+            if not self._future:
+                break
+            self._past.append(self._snapshot())
+            self._restore(self._future.pop())
 
     def _duplicate_item(self, n):
         "Duplicate an item"
@@ -598,60 +1343,480 @@ class Table:
         self.push(n)
         self.push(n)
 
-    def parse_tex(self, lines_thing, append=False):
-        "Read lines from an iterable thing of TeX source, and append to self"
-
+    def parse_tex(self, lines_thing, append=False, agenda=None):
+        '''Read lines from an iterable thing of TeX source, and append to self.
+        If you give an agenda, any row-local verbs at the start of it are done
+        as the rows are read, and the rest of the agenda is returned.
+        '''
         if not append:
             self.clear()
         self.indent = 0
+        return self._sink(self._read_tex(lines_thing), agenda)
+
+    @staticmethod
+    def _read_tex(lines_thing):
+        "Generate rows and markers from TeX source"
         eol_pattern = re.compile(r'\s*\\(cr|\\)\Z')
         amp_pattern = re.compile(r'\s*&\s*')
         for line in lines_thing:
             line = eol_pattern.sub('', line.strip())
             if line == "\\noalign{\\medskip}":
-                self.add_blank()
+                yield 'blank'
             elif line == "\\hline":
-                self.add_rule()
+                yield 'rule'
             elif line == "\\noalign{\\vskip2pt\\hrule\\vskip4pt}":
-                self.add_rule()
+                yield 'rule'
             elif line.startswith('%'):
-                self.add_comment(line[1:].rstrip())
+                yield '#' + line[1:].rstrip()
             else:
-                self.append(amp_pattern.split(line))
-
-    def parse_lines(self, lines_thing, splitter=re.compile(r'\s\s+'), splits=0, append=False):
-        "Read lines from an iterable thing, and append to self"
-
+                yield amp_pattern.split(line)
+
+    def parse_lines(self, lines_thing, splitter=re.compile(r'\s\s+'), splits=0, append=False, agenda=None,
+                    fields=None, skip=None):
+        '''Read lines from an iterable thing, and append to self.
+        If you give an agenda, any row-local verbs at the start of it are done
+        as the rows are read, and the rest of the agenda is returned.
+        If you give a list of field indexes, only those fields are kept, or
+        if you give a list to skip, those fields are thrown away.
+        '''
         if not append:
             self.clear()
             self.indent = 99
+        rest = self._sink(self._read_lines(lines_thing, splitter, splits, fields, skip), agenda)
+        # catch empty tables
+        if not self.data:
+            self.indent = 0
+        return rest
+
+    def _read_lines(self, lines_thing, splitter, splits, fields=None, skip=None):
+        "Generate rows and markers from plain text lines, noting the indent as we go"
+        if fields and not splits:
+            # no need to split up the rest of the line
+            splits = max(fields) + 1
         for raw_line in lines_thing:
             raw_line = raw_line.replace("\t", "    ")
             stripped_line = raw_line.strip()
             if not stripped_line:
-                self.add_blank()
+                yield 'blank'
             elif set(stripped_line) == {'-'}:
-                self.add_rule()
+                yield 'rule'
             elif stripped_line.startswith('#'):
-                self.add_comment(stripped_line)
+                yield stripped_line
             else:
-                self.append(splitter.split(stripped_line, maxsplit=splits))
                 self.indent = min(self.indent, len(raw_line) - len(raw_line.lstrip()))
-        # catch empty tables
-        if not self.data:
-            self.indent = 0
-
-    def parse_lol(self, list_of_iterables, append=False, filler=''):
-        "pass lol into self.data"
+                row = splitter.split(stripped_line, maxsplit=splits)
+                if fields:
+                    row = list(row[i] if i < len(row) else '' for i in fields)
+                elif skip:
+                    row = list(x for i, x in enumerate(row) if i not in skip)
+                yield row
+
+    def parse_lol(self, list_of_iterables, append=False, filler='', agenda=None):
+        '''pass lol into self.data.
+        If you give an agenda, any row-local verbs at the start of it are done
+        as the rows are read, and the rest of the agenda is returned.
+        '''
         if not append:
             self.clear()
+        return self._sink(self._read_lol(list_of_iterables), agenda, filler)
+
+    @staticmethod
+    def _read_lol(list_of_iterables):
+        "Generate rows and markers from a list of iterables"
         for r in list_of_iterables:
+            r = list(r)
             if not r:
-                self.add_blank()
+                yield 'blank'
             elif set(''.join(str(x) for x in r)) == {'-'}:
+                yield 'rule'
+            else:
+                yield r
+
+    async def aparse_lines(self, async_lines, splitter=re.compile(r'\s\s+'), splits=0, append=False, agenda=None,
+                           fields=None, skip=None):
+        '''Like parse_lines, but reading the lines from an async iterable, so that an asyncio
+        service can go on with other things while the table is built.
+        '''
+        return await self._aparse(self.parse_lines, async_lines, splitter=splitter, splits=splits,
+                                  append=append, agenda=agenda, fields=fields, skip=skip)
+
+    async def aparse_lol(self, async_rows, append=False, filler='', agenda=None):
+        "Like parse_lol, but reading the rows from an async iterable"
+        return await self._aparse(self.parse_lol, async_rows, append=append, filler=filler, agenda=agenda)
+
+    async def _aparse(self, parse, things, batch=1000, **kwargs):
+        '''Run one of the parse methods in a worker thread, feeding it batches of things from
+        an async iterable through a queue, so that the row-local verbs still see every
+        row in turn.  We stop reading early if the parse has finished, after a head.
+        '''
+        import asyncio
+        import contextvars
+        import queue
+        batches = queue.SimpleQueue()
+
+        def source():
+            while True:
+                things = batches.get()
+                if things is None:
+                    return
+                yield from things
+
+        # the worker thread needs our decimal context, with its precision, as well
+        work = functools.partial(contextvars.copy_context().run, parse, source(), **kwargs)
+        reading = asyncio.get_running_loop().run_in_executor(None, work)
+        try:
+            waiting = []
+            async for thing in things:
+                waiting.append(thing)
+                if len(waiting) < batch:
+                    continue
+                batches.put(waiting)
+                waiting = []
+                # don't get too far ahead of the parse
+                while batches.qsize() > 2 and not reading.done():
+                    await asyncio.sleep(0.001)
+                if reading.done():
+                    break
+            batches.put(waiting)
+        finally:
+            batches.put(None)
+        return await reading
+
+    def _sink(self, items, agenda=None, filler=''):
+        '''Store a stream of rows and markers in the table, after passing them through
+        any row-local verbs at the start of the agenda.  Returns the rest of the agenda,
+        or None if there was no agenda.
+        A row is a list, anything else is a marker: 'blank', 'rule', or a '#comment'.
+        '''
+        rest = None
+        widest = 0
+        reshaped = False
+        if agenda is not None:
+            rest = []
+            steps = self._parse_agenda(agenda)
+
+            # a filter might drop the widest rows, but the table should still be as wide as
+            # every row that was read, just as if they had all been stored before the filter
+            def _measure(items):
+                nonlocal widest
+                for item in items:
+                    if not isinstance(item, str) and len(item) > widest:
+                        widest = len(item)
+                    yield item
+
+            items = _measure(items)
+            while steps and self._streamable(*steps[0]):
+                op, _, argument = steps.pop(0)
+                items = self.streams[op](items, argument)
+                reshaped = reshaped or op == 'arr'  # then the arr says how wide the rows are
+            for op, _, argument in steps:
+                rest.append(op)
+                rest.extend(argument.split())
+
+        if self._spill is not None:
+            self._spill_items(items, filler)
+            if widest > self.cols and not reshaped:
+                extra = widest - self.cols
+                self._widths.extend([0] * extra)
+                self._numbers.extend([0] * extra)
+                self._present.extend([0] * extra)
+                self.cols = widest
+            return rest
+
+        for item in items:
+            if not isinstance(item, str):
+                self.append(item, filler)
+            elif item == 'blank':
+                self.add_blank()
+            elif item == 'rule':
                 self.add_rule()
             else:
-                self.append(r, filler)
+                self.add_comment(item)
+        if widest > self.cols and not reshaped:
+            self._widen(widest, filler)
+        return rest
+
+    def spill(self, fileobj):
+        '''From now on, send the rows that are read to fileobj (an open binary file) instead
+        of keeping them, and read them back again when the table is written out.
+        '''
+        self._spill = fileobj
+        self.clear()
+
+    def _spill_items(self, items, filler):
+        "Pickle the rows and markers to the spill file, measuring the columns as we go"
+        import pickle
+        self._filler = filler
+        self._spill.seek(0, os.SEEK_END)  # in case a read back is still under way
+        for item in items:
+            if isinstance(item, str):
+                if item.startswith('#'):
+                    item = '#' + item.lstrip('#')
+            else:
+                item = list(self._text(filler if x == '' else x) for x in item)
+                if not item:
+                    continue
+                item[-1] = ' '.join(item[-1].split())
+                if len(item) > self.cols:
+                    extra = len(item) - self.cols
+                    self._widths.extend([0] * extra)
+                    self._numbers.extend([0] * extra)
+                    self._present.extend([0] * extra)
+                    self.cols = len(item)
+                for j, cell in enumerate(item):
+                    if len(cell) > self._widths[j]:
+                        self._widths[j] = len(cell)
+                    if self._number(cell)[0]:
+                        self._numbers[j] += 1
+                    self._present[j] += 1
+                self._spilled += 1
+            pickle.dump(item, self._spill, pickle.HIGHEST_PROTOCOL)
+
+    def _unspill(self):
+        '''Read back the rows from the spill file, with the markers in front of each one,
+        filling out any short rows.  Markers after the last row are dropped, as usual.
+        '''
+        import pickle
+        self._spill.flush()
+        self._spill.seek(0)
+        markers = []
+        try:
+            while True:
+                try:
+                    item = pickle.load(self._spill)
+                except EOFError:
+                    break
+                if isinstance(item, str):
+                    markers.append(item)
+                    continue
+                yield markers, item + [self._filler] * (self.cols - len(item))
+                markers = []
+        finally:
+            # back to the end, even if we were only asked for some of the rows
+            self._spill.seek(0, os.SEEK_END)
+
+    def _spillable(self, agenda):
+        '''Can this agenda be done with the rows in a spill file?  Only if all the verbs
+        can be done as the table is read, except for make at the end.
+        '''
+        steps = self._parse_agenda(agenda)
+        while steps and self._streamable(*steps[0]):
+            steps.pop(0)
+        return all(op == 'make' for op, _, _ in steps)
+
+    def _streamable(self, op, function, argument):
+        '''Can this step be done one row at a time as the table is read?
+        Only if it does not need to know about the whole table...
+        '''
+        if function is None or op not in self.streams:
+            return False
+        if not argument and op in ('filter', 'arr', 'tap'):
+            return False
+        if op in ('arr', 'tap') and self.engine == 'numpy':
+            return False
+        return not {'rows', 'total', 'col_total'}.intersection(re.findall(r'\w+', argument))
+
+    @staticmethod
+    def _fits(op, argument, cols):
+        '''Does this step only use columns that are in the first row, which is cols wide?
+        A stream works out the columns from the first row, but the table is as wide as its
+        widest row, so with ragged input a step that uses any other column might not get
+        the same answer as the table is read as it would from the whole table.
+
+        >>> Table._fits('filter', 'b>3 or a==Ely', 2)
+        True
+        >>> Table._fits('filter', 'c>3', 2)
+        False
+        >>> Table._fits('arr', 'ba(sqrt(a))', 2), Table._fits('arr', 'cb', 2), Table._fits('arr', '~', 2)
+        (True, False, False)
+        >>> Table._fits('tap', 'x+1', 2), Table._fits('tap', 'x/cols', 2)
+        (True, False)
+        '''
+        if cols is None:
+            return True
+        if op == 'arr' and '~' in argument:
+            return False
+        letters = set()
+        depth = 0
+        for name in re.findall(r'[A-Za-z_]\w*|[()]', argument):
+            if name == '(':
+                depth += 1
+            elif name == ')':
+                depth -= 1
+            elif name == 'cols':
+                return False
+            elif op == 'arr' and depth == 0:
+                letters.update(name)  # a perm like "cb" is a run of columns
+            elif op in ('arr', 'filter') and len(name) == 1:
+                letters.add(name.lower())
+        return all(ord(x.lower()) - ord('a') < cols for x in letters)
+
+    def _pushable_filter(self, agenda, cols=None):
+        '''If the agenda starts with a filter that only looks at one row at a time
+        (so no row_number, rows, or accumulators) return the words for it, so that
+        it can be done as the table is read.  Otherwise return None.
+        If you give the width of the first row, the filter must only use columns in it.
+        '''
+        steps = self._parse_agenda(agenda)
+        if not steps or steps[0][0] != 'filter' or not self._streamable(*steps[0]):
+            return None
+        if not self._fits('filter', steps[0][2], cols):
+            return None
+        ok, cc = compile_as_decimal(steps[0][2].replace('@', ''), self.numeric != 'float')
+        if not ok:
+            return None
+        if any(n in ('row_number', 'rows') or (len(n) == 1 and n.isupper()) for n in cc.co_names):
+            return None
+        return ['filter'] + steps[0][2].split()
+
+    def _pushable_head(self, agenda, cols=None):
+        '''If the agenda has a head, and there are only row-local verbs in front of it,
+        return the words up to and including the head, so that they can be done as
+        the table is read, and we can stop reading as soon as we have enough rows.
+        Otherwise return None.  As for _pushable_filter, cols is the width of the first row.
+        The table will only be as wide as the rows read before the head stopped.
+        '''
+        words = []
+        for step in self._parse_agenda(agenda):
+            if not self._streamable(*step) or not self._fits(step[0], step[2], cols):
+                return None
+            if step[0] == 'arr':
+                cols = None  # every row is the same width after this
+            words.append(step[0])
+            words.extend(step[2].split())
+            if step[0] == 'head':
+                return words
+        return None
+
+    def _pushable_projection(self, agenda, cols):
+        '''If the agenda starts with an arr that just picks out or deletes some columns,
+        return (fields, skip, words) where fields is a list of the indexes of the fields
+        to keep, or skip is a list of the ones to throw away, and words are the words for
+        the arr, so that the projection can be done as the table is read.  Otherwise
+        return None.  Only a-v are allowed, because w-z might count from the end.
+        cols is the width of the widest row in a sample of the input, and all the
+        columns must be inside it, because a letter for a column that is not there
+        is not a column at all.
+        '''
+        steps = self._parse_agenda(agenda)
+        if not steps or steps[0][0] != 'arr' or not steps[0][2]:
+            return None
+        perm = steps[0][2]
+        if not re.match(r'-?[a-v.]+\Z', perm):
+            return None
+        if any(ord(x) - ord('a') >= cols for x in perm if x.isalpha()):
+            return None
+        expressions = self._get_expr_list(perm, cols)
+        if not expressions or not all(len(x) == 1 and 'a' <= x <= 'v' for x in expressions):
+            return None
+        indexes = list(ord(x) - ord('a') for x in expressions)
+        if perm[0] == '-':
+            return (None, indexes, ['arr', perm])
+        return (indexes, None, ['arr', perm])
+
+    def _stream_filter(self, items, expression):
+        "Filter a stream of rows, dropping any markers in front of an unwanted row (unless we are at the top)"
+        header = '@' in expression
+        cols, items = _peek_width(items)
+        ok, wanted = self._row_selector(expression.replace('@', ''), cols)
+        if not ok:
+            self.messages.append(wanted)
+            yield from items
+            return
+
+        pending = []
+        i = 0
+        for item in items:
+            if isinstance(item, str):
+                pending.append(item)
+                continue
+            if (header and i == 0) or wanted(item):
+                yield from pending
+                yield item
+            elif i - header <= 1:
+                yield from pending
+            pending.clear()
+            i += 1
+        yield from pending
+
+    @staticmethod
+    def _stream_head(items, n_spec):
+        "Pass on the first n rows of a stream, and then stop reading"
+        keep = _head_count(n_spec)
+        if keep == 0:
+            return
+        for item in items:
+            yield item
+            if not isinstance(item, str):
+                keep -= 1
+                if keep == 0:
+                    return
+
+    @staticmethod
+    def _stream_sample(items, spec):
+        "Pass on a random sample of the rows in a stream, holding only the rows chosen so far"
+        n, rng, header = _sample_spec(spec)
+        rows = iter(items)
+        # markers at the top, and the header with any markers after it, go straight through
+        for item in rows:
+            if not isinstance(item, str):
+                if not header:
+                    rows = itertools.chain([item], rows)
+                    break
+                header = False
+            yield item
+        yield from _reservoir((item for item in rows if not isinstance(item, str)), n, rng)
+
+    def _stream_rows(self, items, make_function):
+        "Apply a function made for the width of the first row to each row in a stream, filling out short rows"
+        cols, items = _peek_width(items)
+        function = make_function(cols)
+        for item in items:
+            if isinstance(item, str) or function is None:
+                yield item
+            else:
+                if len(item) < cols:
+                    item = item + [''] * (cols - len(item))
+                yield list(self._text(x) for x in function(item))
+
+    def _stream_arr(self, items, perm):
+        "Rearrange the columns in a stream of rows"
+        return self._stream_rows(items, lambda cols: self._row_calculator(perm, cols)[1])
+
+    def _stream_tap(self, items, fstring):
+        "Apply a function to the numbers in a stream of rows"
+
+        def _make(cols):
+            ok, calculate = self._cell_calculator(fstring, cols)
+            if not ok:
+                self.messages.append(calculate)
+                return None
+            return calculate
+
+        return self._stream_rows(items, _make)
+
+    def _stream_dp(self, items, dp_string):
+        "Round the numbers in a stream of rows"
+        return self._stream_rows(items, lambda cols: self._row_formatter(dp_string, rounders, cols))
+
+    def _stream_sf(self, items, sf_string):
+        "Round the numbers in a stream of rows to n sig figs"
+        return self._stream_rows(items, lambda cols: self._row_formatter(sf_string, siggy, cols))
+
+    def _stream_nospace(self, items, joiner):
+        "Remove spaces from the values in a stream of rows"
+        return self._stream_rows(items, lambda cols: lambda r: _squeeze(r, joiner))
+
+    def _stream_ditto(self, items, marker):
+        "Fix up ditto marks in a stream of rows"
+        if marker.strip() == "":
+            marker = '"'
+        previous = []
+        for item in items:
+            if not isinstance(item, str):
+                item = list(previous[j] if c == marker and j < len(previous) else c for j, c in enumerate(item))
+                previous = item
+            yield item
 
     def pop(self, n=None):
         '''Remove an entire row, saving it in case we want it later
@@ -667,6 +1832,7 @@ class Table:
 
         if r is not None:
             self.stack.append(r)
+            self._measured = None
 
         return r
 
@@ -694,13 +1860,49 @@ class Table:
         if n < self.cols:
             row.extend([filler] * (self.cols - n))
         elif self.cols < n:
-            for r in self.data:
-                r.extend([filler] * (n - self.cols))
-            self.cols = n
+            self._widen(n, filler)
 
         # they should all be strings, and normalize space in last column...
         if n > 0:
-            self.data.insert(i, [str(x) for x in row[:-1]] + [' '.join(str(row[-1]).split())])
+            intern = self._intern
+            last = len(row) - 1
+            row = [intern(self._text(x), j) for j, x in enumerate(row[:-1])] + [
+                intern(' '.join(self._text(row[-1]).split()), last)]
+            self.data.insert(i, row)
+            if self._measured is not None:
+                self._count_row(row)
+
+    def _widen(self, n, filler=''):
+        "Fill out every row with filler, so that the table is n columns wide"
+        for r in self.data:
+            r.extend([filler] * (n - self.cols))
+        if self._measured is not None:
+            self._widths.extend([len(filler) if self.data else 0] * (n - self.cols))
+            self._numbers.extend([len(self.data) if self._number(filler)[0] else 0] * (n - self.cols))
+        self.cols = n
+
+    def _intern(self, value, j):
+        '''Return the copy of value that we already have in column j, if any, so that rows
+        with repeated values (like names, status words, or dates) all share one string.
+        Once a column has more than distinct_values different values (like an id or
+        a time stamp) we stop for that column, so its dictionary does not grow for ever,
+        but the other columns go on sharing theirs.
+        '''
+        try:
+            seen = self._values[j]
+        except IndexError:
+            self._values.extend({} for _ in range(j + 1 - len(self._values)))
+            seen = self._values[j]
+        if seen is None:
+            return value
+        try:
+            return seen[value]
+        except KeyError:
+            if len(seen) < self.distinct_values:
+                seen[value] = value
+            else:
+                self._values[j] = None
+            return value
 
     def copy(self):
         "Implement the standard copy method"
@@ -708,16 +1910,88 @@ class Table:
 
     def do(self, agenda=None):
         "Do what we've been asked..."
+        for function, argument in self._steps(agenda):
+            function(argument)
+
+    async def ado(self, agenda=None, executor=None):
+        '''Do the agenda like do, but one verb at a time in a worker thread (or the executor
+        given), so that an asyncio service can go on with other things meanwhile.
+        Leave the table alone until this has finished.
+        '''
+        import asyncio
+        import contextvars
+        loop = asyncio.get_running_loop()
+        for function, argument in self._steps(agenda):
+            # run it with our decimal context, since each thread has its own
+            await loop.run_in_executor(executor, contextvars.copy_context().run, function, argument)
+
+    def _steps(self, agenda):
+        '''Generate the (function, argument) pairs for each verb in the agenda, keeping the
+        history up to date for undo as we go.  Each one should be done before asking for the next,
+        because we stop if a verb leaves any messages.
+        '''
         if agenda is None:
             return
 
-        if not isinstance(agenda, list):
+        # the verbs change the data in all sorts of ways, so measure it again next time,
+        # and make the typed columns again, in case the cells were changed since the last agenda
+        self._measured = None
+        self._typed.clear()
+
+        steps = self._parse_agenda(agenda)
+        if self.optimize:
+            steps = self._plan(steps)
+
+        # even with no history, an agenda with an undo in it can go back to its own start
+        keep = self.history or (len(steps) if any(op == 'undo' for op, _, _ in steps) else 0)
+
+        self._depth += 1
+        try:
+            for op, function, argument in steps:
+                if function is None:
+                    self.messages.append(f'?? {op}')
+                    break
+
+                # a verb that calls do is still only one step to undo
+                if keep and op not in ('undo', 'redo') and self._depth == 1:
+                    self._past.append(self._snapshot())
+                    self._future.clear()
+                    if len(self._past) > keep:
+                        self._past.popleft()
+
+                if op not in ('sort', 'uniq', 'sort+uniq', 'filter', 'head', 'sample', 'make'):
+                    self._typed.clear()  # the cells might change, but these only move or drop rows
+                yield function, argument
+                if op not in ('sort', 'uniq', 'filter'):
+                    self._mirror = None  # the cells might have changed
+                if self.messages:
+                    break
+        finally:
+            self._depth -= 1
+            self._mirror = None
+            if not self.history and self._depth == 0:
+                self._past.clear()
+                self._future.clear()
+
+    def _parse_agenda(self, agenda):
+        '''Split up an agenda into a list of (verb, function, argument) steps.
+        An unknown verb gets None as its function, and stops the parsing.
+        Explain takes all the rest of the agenda as its argument.
+        '''
+        if isinstance(agenda, list):
+            agenda = agenda[:]
+        else:
             agenda = agenda.split()
 
+        steps = []
         while agenda:
             op = agenda.pop(0)
             if op not in self.operations:
-                self.messages.append(f'?? {op}')
+                steps.append((op, None, ''))
+                break
+
+            if op == 'explain':
+                steps.append((op, self.operations[op], ' '.join(agenda)))
                 break
 
             # get any arguments
@@ -725,9 +1999,226 @@ class Table:
             while agenda and agenda[0] not in self.operations:
                 argument.append(agenda.pop(0))
 
-            self.operations[op](' '.join(argument))
-            if self.messages:
-                break
+            steps.append((op, self.operations[op], ' '.join(argument)))
+
+        return steps
+
+    def _explain_agenda(self, agenda):
+        "Show the optimized plan for the rest of the agenda, instead of doing it"
+        for op, _, argument in self._plan(self._parse_agenda(agenda)):
+            self.messages.append(f'# plan: {op} {argument}'.rstrip())
+        if not self.messages:
+            self.messages.append('# plan: nothing to do')
+
+    def _plan(self, steps):
+        '''Rewrite a list of steps so that it does the same thing more efficiently.
+
+        - push an order-independent filter ahead of any sorts, so that we sort fewer rows
+        - project away columns early, if a later arr will throw them away anyway
+        - merge consecutive arr steps into a single arr
+        - turn sort X + uniq X into a single grouping pass
+
+        The rewrites are only done where we can be sure that the result will be the same,
+        which means that we need to know how many columns there will be at each step.
+        '''
+        # undo and redo put back an earlier table, so nothing can be moved past them,
+        # and we do not know what the table will look like afterwards
+        for k, (op, _, _) in enumerate(steps):
+            if op in ('undo', 'redo'):
+                return self._plan(steps[:k]) + steps[k:]
+
+        plan = []
+        for step in steps:
+            plan.append(step)
+            # bubble a filter back through the sorts in front of it
+            k = len(plan) - 1
+            while k > 0 and self._filter_can_jump_sort(plan[k], plan[k - 1], plan[:k - 1]):
+                plan[k - 1], plan[k] = plan[k], plan[k - 1]
+                k -= 1
+
+        plan = self._plan_projections(plan)
+
+        out = []
+        cols = self.cols
+        for step in plan:
+            op, _, argument = step
+            if out and op == 'arr' and out[-1][0] == 'arr' and out[-1][3] is not None:
+                merged = self._merge_arrangements(out[-1][2], argument, out[-1][3])
+                if merged is not None:
+                    out[-1] = ('arr', self.operations['arr'], merged, out[-1][3])
+                    cols = self._planned_cols(out[-1], out[-1][3])
+                    continue
+            elif out and op == 'uniq' and out[-1][0] == 'sort' and self._same_col_spec(out[-1][2], argument):
+                out[-1] = ('sort+uniq', self._sort_and_remove_duplicates, out[-1][2], out[-1][3])
+                continue
+            out.append(step + (cols,))
+            cols = self._planned_cols(step, cols)
+
+        return [step[:3] for step in out]
+
+    def _planned_cols(self, step, cols):
+        '''How many columns will there be after this step, if we know?'''
+        op, _, argument = step[:3]
+        if cols is None:
+            return None
+        if op in ('filter', 'sort', 'uniq', 'sort+uniq', 'dp', 'sf', 'nospace', 'ditto', 'group',
+                  'rule', 'noblanks', 'shuffle', 'roll', 'head', 'make', 'help', 'levels', 'label', 'add', 'explain'):
+            return cols
+        if op == 'arr':
+            expressions = self._planned_expressions(argument, cols)
+            return None if expressions is None else len(expressions)
+        return None
+
+    def _planned_expressions(self, perm, cols):
+        '''The expressions that arr will produce from perm when there are cols columns,
+        or None if any of them might produce more than one column (or if it is a no-op)
+        '''
+        if not perm:
+            return None
+        identity = string.ascii_lowercase[:cols]
+        if perm[0] == '-':
+            if not all(c in string.ascii_lowercase for c in perm[1:]):
+                return None
+            delenda = self._get_expr_list(perm, cols)
+            return [c for c in identity if c not in delenda]
+
+        expressions = self._get_expr_list(perm, cols)
+        if not expressions or any(re.search(r'\w\s*\(', x) for x in expressions):
+            return None  # a function might return a tuple
+        return expressions
+
+    def _merge_arrangements(self, first, second, cols):
+        '''Combine arr first + arr second into a single perm, if possible'''
+        one = self._planned_expressions(first, cols)
+        if one is None:
+            return None
+        two = self._planned_expressions(second, len(one))
+        if two is None or not all(len(x) == 1 and x in string.ascii_lowercase[:len(one)] for x in two):
+            return None
+
+        # if the first one calculates anything, then all the values are converted to numbers
+        # so we need to make sure that the merged one calculates too
+        calculating = not all(len(x) == 1 and x in string.ascii_lowercase[:cols] + '?' for x in one)
+        merged = [one[ord(x) - ord('a')] for x in two]
+        if calculating:
+            merged = [f'({x})' if len(x) == 1 else x for x in merged]
+        if not merged:
+            return None
+        return ''.join(merged)
+
+    def _filter_can_jump_sort(self, step, previous, earlier):
+        '''Can this filter step be done before the previous sort step?'''
+        if step[0] != 'filter' or previous[0] != 'sort':
+            return False
+
+        # sort and filter do not move special rows in the same way
+        if self.extras or any(op in ('rule', 'group') for op, _, _ in earlier):
+            return False
+
+        # the header has to be treated the same way by both of them
+        if ('@' in step[2]) != ('@' in previous[2]):
+            return False
+
+        ok, cc = compile_as_decimal(step[2].replace('@', ''))
+        return ok and not any(n == 'row_number' or n == 'randomd' or (len(n) == 1 and n.isupper()) for n in cc.co_names)
+
+    def _same_col_spec(self, sort_spec, uniq_spec):
+        '''Are these two letter specs the same columns in the same order (ignoring case in uniq)?'''
+        if ('@' in sort_spec) != ('@' in uniq_spec):
+            return False
+        a = sort_spec.replace('@', '')
+        b = uniq_spec.replace('@', '')
+        return all(c in string.ascii_letters for c in a + b) and a.lower() == b.lower()
+
+    def _plan_projections(self, plan):
+        '''If an arr only needs some of the columns, and the steps before it are
+        filters, sorts, or uniqs that only refer to those columns, then put a simple
+        projection in front of them, and rename the columns in the steps that follow.
+        '''
+        out = []
+        cols = self.cols
+        for step in plan:
+            op, function, argument = step
+            before = cols
+            cols = self._planned_cols(step, cols)
+            out.append(step)
+            if op != 'arr' or before is None:
+                continue
+
+            # find the run of movable steps in front of this arr
+            k = len(out) - 1
+            start = k
+            while start > 0 and out[start - 1][0] in ('filter', 'sort', 'uniq'):
+                start -= 1
+            if start == k:
+                continue
+
+            identity = string.ascii_lowercase[:before]
+            needed = self._columns_needed(argument, before)
+            for movable in out[start:k]:
+                if needed is None:
+                    break
+                needed = self._columns_needed_by(movable, identity, needed)
+            if not needed or len(needed) == len(identity):
+                continue
+
+            keep = sorted(needed)
+            mapping = {c: string.ascii_lowercase[i] for i, c in enumerate(keep)}
+            renamed = [(o, f, self._rename_columns(a, mapping, o)) for o, f, a in out[start:k]]
+            perm = ''.join(self._rename_columns(x, mapping, 'arr') for x in self._planned_expressions(argument, before))
+            out[start:] = [('arr', self.operations['arr'], ''.join(keep))] + renamed
+            if perm != string.ascii_lowercase[:len(keep)]:
+                out.append((op, function, perm))
+
+        return out
+
+    def _columns_needed(self, perm, cols):
+        '''Which columns does an arr perm use?  None means we can't tell, or all of them'''
+        identity = string.ascii_lowercase[:cols]
+        expressions = self._planned_expressions(perm, cols)
+        if expressions is None or '~' in perm:
+            return None
+        needed = set()
+        for x in expressions:
+            if len(x) == 1:
+                if x == '?':
+                    continue
+                if x.lower() not in identity:
+                    return None
+                needed.add(x.lower())
+                continue
+            names = set(re.findall(r'[A-Za-z_]\w*', re.sub(r"'[^']*'|\"[^\"]*\"", '', x)))
+            if names & {'cols', 'total', 'row_total', 'w', 'x', 'y', 'z', 'W', 'X', 'Y', 'Z'}:
+                return None
+            needed.update(n.lower() for n in names if len(n) == 1 and n.lower() in identity)
+        return needed
+
+    def _columns_needed_by(self, step, identity, needed):
+        '''Add the columns that a filter, sort or uniq step uses to needed'''
+        op, _, argument = step
+        spec = argument.replace('@', '')
+        if op in ('sort', 'uniq'):
+            if not spec or not all(c in string.ascii_letters and c.lower() in identity for c in spec):
+                return None
+            return needed | set(spec.lower())
+
+        # filter: any single letter outside quotes is a column or an accumulator
+        names = set(re.findall(r'[A-Za-z_]\w*', re.sub(r"'[^']*'|\"[^\"]*\"", '', spec)))
+        return needed | set(n.lower() for n in names if len(n) == 1 and n.lower() in identity)
+
+    @staticmethod
+    def _rename_columns(argument, mapping, op):
+        '''Rename the column letters in the argument of a step'''
+        if op in ('sort', 'uniq'):
+            return ''.join(mapping[c.lower()].upper() if c.isupper() else mapping.get(c, c) for c in argument)
+
+        def _rename(mob):
+            word = mob.group(0)
+            if word[0] in '"\'' or word.lower() not in mapping:
+                return word
+            return mapping[word.lower()].upper() if word.isupper() else mapping[word]
+
+        return re.sub(r"'[^']*'|\"[^\"]*\"|\b[A-Za-z]\b", _rename, argument)
 
     def _label_columns(self, names=''):
         "add some labels"
@@ -746,10 +2237,156 @@ class Table:
     def column(self, i):
         "get a column from the table - zero indexed"
         try:
-            return [is_as_number(r[i]) for r in self.data]
+            return [self._number(r[i]) for r in self.data]
         except IndexError:
             return []
 
+    def typed_column(self, i):
+        '''Get column i as a compact array of machine numbers, 8 bytes a value:
+        an array('q') if every cell is a plain whole number that prints the same
+        way again, or an array('d') if every cell is a plain finite float,
+        otherwise None.  The array is an extra copy of the column, kept alongside the text
+        until the cells change.  Sort, filter, and head move the arrays with the rows,
+        and if anything else has moved the rows, the arrays are made again.
+        '''
+        rows = self._typed_rows
+        if self._typed and (len(rows) != len(self.data) or not all(map(operator.is_, rows, self.data))):
+            self._typed.clear()
+        if i in self._typed:
+            return self._typed[i]
+        if not self._typed:
+            self._typed_rows = self.data[:]
+
+        try:
+            cells = [r[i] for r in self.data]
+        except IndexError:
+            cells = []
+
+        typed = None
+        if cells:
+            try:
+                typed = array.array('q', map(int, cells))
+                if any(str(n) != cell for n, cell in zip(typed, cells)):
+                    raise ValueError  # like "007" or "1_000", which we could not print the same way
+            except (ValueError, OverflowError):
+                try:
+                    typed = array.array('d', map(float, cells))
+                except ValueError:
+                    typed = None
+                else:
+                    if not all(map(math.isfinite, typed)):
+                        typed = None
+
+        self._typed[i] = typed
+        return typed
+
+    def _move_typed(self, pick):
+        '''Keep the typed columns in step with the rows, after a verb has only moved or dropped
+        some of them: pick takes an array and gives its values for the rows as they are now.
+        Floats are dropped, to be made again, since the rows left might all be whole numbers.
+        '''
+        for i, typed in list(self._typed.items()):
+            if typed is None or typed.typecode != 'q':
+                del self._typed[i]
+            else:
+                self._typed[i] = array.array('q', pick(typed))
+        self._typed_rows = self.data[:]
+
+    def _numeric_array(self, i):
+        '''Get column i as a float64 array for the NumPy engine,
+        or None if any cell in the column is not a number
+        '''
+        numpy = _numpy()
+        cells = [r[i] for r in self.data]
+        try:
+            a = numpy.array(cells, dtype=numpy.float64)
+        except ValueError:
+            pass
+        else:
+            if numpy.isfinite(a).all():
+                return a
+
+        values = []
+        for cell in cells:
+            flag, value = is_as_number(cell)
+            if not flag or isinstance(value, bool):
+                return None
+            values.append(float(value))
+        return numpy.array(values, dtype=numpy.float64)
+
+    def _vectorized_columns(self, expressions):
+        '''Try to work out all the arr expressions as whole-column NumPy operations.
+        Returns a list of new columns, or None if we need the Decimal path.
+        '''
+        numpy = _numpy()
+        if numpy is None or not self.data:
+            return None
+
+        identity = string.ascii_lowercase[:self.cols]
+        arrays = {}
+        columns = []
+        for x in expressions:
+            if len(x) == 1 and x in identity:
+                columns.append([str(is_as_number(r[ord(x) - ord('a')])[1]) for r in self.data])
+                continue
+
+            ok, cc = compile_as_numpy(x)
+            if not ok:
+                return None
+
+            names = {}
+            for n in cc.co_names:
+                if n in NUMPY_FUNCTIONS:
+                    names[n] = getattr(numpy, n)
+                    continue
+                if n not in identity:
+                    return None
+                if n not in arrays:
+                    arrays[n] = self._numeric_array(ord(n) - ord('a'))
+                if arrays[n] is None:
+                    return None
+                names[n] = arrays[n]
+
+            with numpy.errstate(all='ignore'):
+                result = numpy.broadcast_to(eval(cc, {'__builtins__': {}}, names), (len(self.data),))
+            columns.append([_format_float(v) for v in result.tolist()])
+
+        return columns
+
+    def _vectorized_cells(self, fstring):
+        '''Try to apply a tap function to all the numeric cells at once with NumPy.
+        Returns a grid of new values, with None where the cell was not a number,
+        or None if we need the Decimal path.
+        '''
+        numpy = _numpy()
+        if numpy is None:
+            return None
+
+        ok, cc = compile_as_numpy(fstring)
+        if not ok or any(n != 'x' and n not in NUMPY_FUNCTIONS for n in cc.co_names):
+            return None
+
+        where = []
+        numbers = []
+        for i, row in enumerate(self.data):
+            for j, cell in enumerate(row):
+                flag, value = is_as_number(cell)
+                if flag and not isinstance(value, bool):
+                    where.append((i, j))
+                    numbers.append(float(value))
+        if not numbers:
+            return None
+
+        names = {n: getattr(numpy, n) for n in NUMPY_FUNCTIONS}
+        names['x'] = numpy.array(numbers, dtype=numpy.float64)
+        with numpy.errstate(all='ignore'):
+            result = numpy.broadcast_to(eval(cc, {'__builtins__': {}}, names), (len(numbers),))
+
+        grid = [[None] * len(row) for row in self.data]
+        for (i, j), v in zip(where, result.tolist()):
+            grid[i][j] = _format_float(v)
+        return grid
+
     def _valid_data_index(self, s):
         '''turn s into an index for self.data
         default to len(self.data)
@@ -769,15 +2406,15 @@ class Table:
 
     def add_blank(self, n=None):
         "flag a blank"
-        self.extras[self._valid_data_index(n)].add("blank")
+        self.extras.add(self._valid_data_index(n), "blank")
 
     def add_rule(self, n=None):
         "mark a rule"
-        self.extras[self._valid_data_index(n)].add("rule")
+        self.extras.add(self._valid_data_index(n), "rule")
 
     def add_comment(self, contents, n=None):
         "stash a comment line"
-        self.extras[self._valid_data_index(n)].add('#' + contents.lstrip('#'))
+        self.extras.add(self._valid_data_index(n), '#' + contents.lstrip('#'))
 
     def _set_output_form(self, form_name):
         "Set the form name, used in `tabulate`"
@@ -789,6 +2426,8 @@ class Table:
         self.cols = len(self.data)
         self.data = list(list(r) for r in zip(*self.data))
         self.extras.clear()
+        self._measured = None
+        self._typed.clear()
 
     def _select_matching_rows(self, expression):
         '''Filter the table to rows where expression is true
@@ -801,40 +2440,32 @@ class Table:
             header = self.pop(0)
             expression = expression.replace('@', '')
 
-        ok, cc = compile_as_decimal(expression)
+        ok, wanted = self._row_selector(expression, self.cols, len(self.data))
         if not ok:
-            self.messages.append(cc)
+            self.messages.append(wanted)
         else:
+            keeps = self._typed_selection(expression)
+            if keeps is None and self._sqlite_ready():
+                keeps = self._sqlite_selection(expression, wanted)
             old_data = self.data[:]
+            old_extras = self.extras.copy()
             self.data.clear()
-            identity = string.ascii_lowercase[:self.cols]
-            value_dict = {}
-            value_dict['rows'] = len(old_data)
-            for k in identity:
-                value_dict[k.upper()] = 0  # accumulators
-
-            # the idea here is that we treat unknown names as strings, to allow you to say b=whatever
-            # instead of having to write b='whatever'.  The co_names attribute of the compiled code
-            # is a list of the names in the compiled object
-            for n in cc.co_names:
-                if n not in identity and n not in Panther and n not in value_dict:
-                    value_dict[n] = n
-
-            for i, r in enumerate(old_data):
-                value_dict['row_number'] = i + 1
-                for k, v in zip(identity, r):
-                    flag, value_dict[k] = is_as_number(v)
-                    if flag:
-                        value_dict[k.upper()] += value_dict[k]
-
-                try:
-                    wanted = eval(cc, Panther, value_dict)
-                except (TypeError, NameError, ArithmeticError):
-                    wanted = True  # default to keeping the row
-                if wanted:
-                    self.append(r)
-                elif i > 1 and i in self.extras:
-                    self.extras.pop(i)  # remove extras if line not wanted (unless we are at the top)
+            self.extras.clear()
+            # extras are indexed from the top of the table, including any header
+            offset = 0 if header is None else 1
+            if offset:
+                self.extras.update(0, old_extras[0])
+            if keeps is None:
+                keeps = map(wanted, old_data)
+            for i, (r, keep) in enumerate(zip(old_data, keeps)):
+                # keep the extras with the line, or remove them if line not wanted (unless we are at the top)
+                if keep or i <= 1:
+                    self.extras.update(len(self.data) + offset, old_extras[i + offset])
+                if keep:
+                    self.data.append(r)  # it is already a proper row, so we do not need insert
+            self.extras.update(len(self.data) + offset, old_extras[len(old_data) + offset])
+            if self._typed and isinstance(keeps, list):
+                self._move_typed(lambda a: itertools.compress(a, keeps))
 
         if header is not None:
             self.insert(0, header)
@@ -842,8 +2473,105 @@ class Table:
         if not self.data:
             self.cols = 0
 
+    def _typed_selection(self, expression):
+        '''If the filter expression is a simple comparison on a typed column,
+        work it out over the whole column at once, and return a list of flags,
+        otherwise None.  In decimal mode we only do this for whole numbers.
+        '''
+        simple = _simple_comparison(expression)
+        if simple is None:
+            return None
+        col, compare, number = simple
+        c = ord(col) - ord('a')
+        if c >= self.cols:
+            return None
+        typed = self.typed_column(c)
+        if typed is None or (typed.typecode == 'd' and self.numeric != 'float'):
+            return None
+        return list(compare(x, number) for x in typed)
+
+    def _sqlite_ready(self, col_spec='a'):
+        "Should the sqlite engine do this verb?  Only if we are using it, and the column spec is all letters"
+        return self.engine == 'sqlite' and bool(self.data) and col_spec.isascii() and col_spec.isalpha()
+
+    def _sqlite_mirror(self):
+        '''The rows of the table in SQLite, made when we first need them in each agenda, and
+        made again if another verb has moved the rows since.  Any verb that might have changed
+        the cells throws the mirror away, see _steps.
+        '''
+        m = self._mirror
+        if m is None or len(m.order) != len(self.data) or not all(map(operator.is_, m.order, self.data)):
+            m = self._mirror = SQLiteMirror(self.data)
+        return m
+
+    def _sqlite_selection(self, expression, wanted):
+        '''If the filter expression only looks at one column, and at nothing else that changes
+        from row to row, work it out once for each different value in the column with SQLite,
+        and return a list of flags, otherwise None'''
+        ok, cc = compile_as_decimal(expression, self.numeric != 'float')
+        identity = string.ascii_lowercase[:self.cols]
+        columns = set(n for n in cc.co_names if n in identity)
+        if not ok or len(columns) != 1 or any(
+                n in ('row_number', 'rows') or 'random' in n or (len(n) == 1 and n.isupper()) for n in cc.co_names):
+            return None
+
+        import sqlite3
+        c = identity.index(columns.pop())
+        row = [''] * self.cols
+
+        def wanted_value(x):
+            row[c] = x
+            return wanted(row)
+
+        try:
+            return self._sqlite_mirror().select(c, wanted_value)
+        except sqlite3.Error:
+            self._mirror = None
+            return None  # let the Python path show what went wrong
+
+    def _row_selector(self, expression, cols, rows=0):
+        '''Compile a filter expression into a function that takes a row and says
+        whether we want it.  The function keeps the row number and the running
+        accumulators as it goes, so it has to be given the rows in order.
+        Returns (True, function) or (False, message)
+        '''
+        ok, cc = compile_as_decimal(expression, self.numeric != 'float')
+        if not ok:
+            return (False, cc)
+
+        identity = string.ascii_lowercase[:cols]
+        value_dict = {}
+        value_dict['rows'] = rows
+        value_dict['row_number'] = 0
+        for k in identity:
+            value_dict[k.upper()] = 0  # accumulators
+
+        # the idea here is that we treat unknown names as strings, to allow you to say b=whatever
+        # instead of having to write b='whatever'.  The co_names attribute of the compiled code
+        # is a list of the names in the compiled object
+        for n in cc.co_names:
+            if n not in identity and n not in self._functions and n not in value_dict:
+                value_dict[n] = n
+
+        def _wanted(r):
+            value_dict['row_number'] += 1
+            n = len(r)
+            for j, k in enumerate(identity):
+                # a short row is filled out, as insert would have done
+                flag, value_dict[k] = self._number(r[j] if j < n else '')
+                if flag:
+                    value_dict[k.upper()] += value_dict[k]
+
+            try:
+                return eval(cc, self._functions, value_dict)
+            except (TypeError, NameError, ArithmeticError):
+                return True  # default to keeping the row
+
+        return (True, _wanted)
+
     def _shuffle_rows(self, col_spec):
         '''Re-arrange the data at random'''
+        import random
         header = None
         if '@' in col_spec:
             header = self.pop(0)
@@ -864,16 +2592,36 @@ class Table:
         if header is not None:
             self.insert(0, header)
 
+    def _keep_first_rows(self, n_spec):
+        '''Keep the first n rows (default 10), plus the header with @'''
+        keep = _head_count(n_spec)
+        del self.data[keep:]
+        if self._typed:
+            self._move_typed(lambda a: a[:keep])
+        for i in list(self.extras):
+            if i >= keep:
+                self.extras.pop(i)
+        if not self.data:
+            self.cols = 0
+
+    def _sample_rows(self, spec):
+        '''Keep a random sample of n rows (default 10) in their original order'''
+        n, rng, header = _sample_spec(spec)
+        self.data[header:] = _reservoir(self.data[header:], n, rng)
+        for i in list(self.extras):
+            if i > header:
+                self.extras.pop(i)
+        if not self.data:
+            self.cols = 0
+
     def _remove_blank_extras(self, _):
-        for i in range(len(self.data)):
-            self.extras[i].discard('blank')
+        for i in list(self.extras):
+            if i < len(self.data):
+                self.extras.discard(i, 'blank')
 
     def _remove_spaces_from_values(self, joiner):
         '''Remove spaces from values -- this can make it easier to import into R'''
-        if joiner:
-            self.data = [[joiner.join(cell.split()) for cell in row] for row in self.data]
-        else:
-            self.data = [[''.join(cell.title().split()) for cell in row] for row in self.data]
+        self.data = [_squeeze(row, joiner) for row in self.data]
 
     def _apply_function_to_numeric_values(self, fstring):
         '''fstring should be a maths expression with an x, as x+1 or 2**x etc
@@ -884,58 +2632,85 @@ class Table:
         if not fstring:
             return
 
-        if "x" not in fstring and fstring[0] in ('*', '/', '+', '-', '<', '>', '='):
-            fstring = "x" + fstring
-
-        ok, cc = compile_as_decimal(fstring)
+        ok, calculate = self._cell_calculator(fstring, self.cols, self.data)
         if not ok:
-            self.messages.append(cc)
+            self.messages.append(calculate)
             return
 
+        vectorized = self._vectorized_cells(_x_first(fstring)) if self.engine == 'numpy' else None
+
+        old_rows = self.data[:]
+        self.data.clear()
+        for r, row in enumerate(old_rows):
+            self.append(calculate(row, None if vectorized is None else vectorized[r]))
+
+    def _cell_calculator(self, fstring, cols, data=None):
+        '''Compile a tap function into a function that takes a row and returns
+        the new row.  The totals are only worked out if we are given the data.
+        Returns (True, function) or (False, message)
+        '''
+        ok, cc = compile_as_decimal(_x_first(fstring), self.numeric != 'float')
+        if not ok:
+            return (False, cc)
+
         values = {
             "x": 0,
-            "rows": len(self.data),
-            "cols": self.cols,
-            "total": sum(as_decimal(x) for row in self.data for x in row),
+            "rows": 0,
+            "cols": cols,
+            "total": 0,
             "row_number": 0,
         }
-        col_totals = [sum(as_decimal(x[1]) for x in self.column(i) if x[0]) for i in range(self.cols)]
+        col_totals = [0] * cols
+        if data is not None:
+            values['rows'] = len(data)
+            values['total'] = self._total(self._as_number(x) for row in data for x in row)
+            col_totals = [self._total(self._as_number(x[1]) for x in self.column(i) if x[0]) for i in range(cols)]
 
-        old_rows = self.data[:]
-        self.data.clear()
-        for row in old_rows:
+        def _calculate(row, vectorized=None):
             new_row = []
             values['row_number'] += 1
-            values['row_total'] = sum(as_decimal(x) for x in row)
+            values['row_total'] = self._total(self._as_number(x) for x in row)
             for i, cell in enumerate(row):
+                if vectorized is not None and vectorized[i] is not None:
+                    new_row.append(vectorized[i])
+                    continue
                 values['col_number'] = i + 1
-                values['col_total'] = col_totals[i]
-                cell_is_a_number, values['x'] = is_as_number(cell)
+                values['col_total'] = col_totals[i] if i < len(col_totals) else 0
+                cell_is_a_number, values['x'] = self._number(cell)
                 try:
-                    new_value = eval(cc, Panther, values)
+                    new_value = eval(cc, self._functions, values)
                 except Exception:
                     new_row.append(cell)
                 else:
                     if isinstance(new_value, tuple):
                         new_row.extend(new_value)
-                    elif not cell_is_a_number and f"{new_value}".count(cell) > 2:
+                    elif not cell_is_a_number and self._text(new_value).count(cell) > 2:
                         # this was probably 'string'*9 or similar
                         new_row.append(cell)
-                    elif not cell_is_a_number and f"{new_value}" == "0":
+                    elif not cell_is_a_number and self._text(new_value) == "0":
                         # this was probably a title row or col...
                         new_row.append(cell)
                     else:
                         new_row.append(new_value)
+            return new_row
 
-            self.append(new_row)
+        return (True, _calculate)
 
     def _apply_formats(self, f_string, f_function):
         "Used for DP and SF"
+        format_row = self._row_formatter(f_string, f_function, self.cols)
+        if format_row is not None:
+            self.data = list(format_row(r) for r in self.data)
+
+    @staticmethod
+    def _row_formatter(f_string, f_function, cols):
+        "Make a function to format each cell in a row for DP and SF"
         if f_string is None or not f_string.isdigit():
-            return
-        # extend as needed (you could use zip_longest, but this just as simple)
-        f_values = list(int(x) for x in f_string) + [int(f_string[-1])] * (self.cols - len(f_string))
-        self.data = list(list(f_function(c, v) for c, v in zip(r, f_values)) for r in self.data)
+            return None
+        # extend as needed with the last one, for as long as the row is (a streamed row might be wider than cols)
+        f_values = list(int(x) for x in f_string)
+        last = itertools.repeat(f_values[-1])
+        return lambda r: list(f_function(c, v) for c, v in zip(r, itertools.chain(f_values, last)))
 
     def _fix_decimal_places(self, dp_string):
         "Round all the numerical fields in each row"
@@ -979,6 +2754,137 @@ class Table:
                 if cell == marker and i > 0:
                     self.data[i][j] = self.data[i - 1][j]
 
+    def _join_tables(self, argument):
+        '''Join another table on to this one, like a database join, matching the cells
+        in the key columns.  join source [keys] [left]
+
+        The source is "stack" (the rows taken off with pop), the name of a table in
+        named_tables, or a file name.  The keys are the letters of the key columns in
+        this table, then = and the letters in the other table if they are different
+        (just "a" by default), with @ if both tables have a header.  Only rows with a
+        match are kept, unless you say "left", when rows with no match get "-" cells.
+
+        We make a dictionary of the keys of the smaller table, and run the rows of
+        the bigger one past it, so the time is linear, and a big file is only read once.
+        '''
+        words = argument.split()
+        mode = words.pop() if len(words) > 1 and words[-1] in ('inner', 'left') else 'inner'
+        if not words or len(words) > 2:
+            self.messages.append('?! join source [keys] [left]')
+            return
+        source = words[0]
+        spec = words[1] if len(words) > 1 else 'a'
+        header = '@' in spec
+        mine, _, theirs = spec.replace('@', '').partition('=')
+        theirs = theirs or mine
+        if not (mine.isalpha() and theirs.isalpha() and len(mine) == len(theirs)) or not mine.isascii() \
+                or any(ord(x) - ord('a') >= max(self.cols, 1) for x in mine.lower()):
+            self.messages.append('?! join keys ' + spec)
+            return
+        left_keys = list(ord(x) - ord('a') for x in mine.lower())
+        right_keys = list(ord(x) - ord('a') for x in theirs.lower())
+        skip = set(right_keys)
+        if not self.data:
+            return  # nothing to join on to, not even a header
+
+        size, rows = self._join_source(source)
+        if rows is None:
+            self.messages.append('?! join source ' + source)
+            return
+
+        def key(row, keys):
+            return tuple(row[k] if k < len(row) else '' for k in keys)
+
+        def rest(row):
+            return list(x for j, x in enumerate(row) if j not in skip)
+
+        # we only know how wide the other table is once we have read it all
+        widest = 0
+
+        def measured(rows):
+            nonlocal widest
+            for row in rows:
+                widest = max(widest, len(row))
+                yield row
+
+        try:
+            right_header = next(rows, []) if header else None
+            body = self.data[1:] if header else self.data
+            index = {}
+            if size is not None and size <= len(body):
+                for row in measured(rows):
+                    index.setdefault(key(row, right_keys), []).append(rest(row))
+                matches = list(index.get(key(row, left_keys), ()) for row in body)
+            else:
+                for i, row in enumerate(body):
+                    index.setdefault(key(row, left_keys), []).append(i)
+                matches = list([] for _ in body)
+                for row in measured(rows):
+                    for i in index.get(key(row, right_keys), ()):
+                        matches[i].append(rest(row))
+        finally:
+            rows.close()  # in case we did not get to the end of a file
+
+        widest = max(widest, len(right_header or ()), 1)
+        if any(k >= widest for k in right_keys):
+            self.messages.append('?! join keys ' + spec)
+            return
+
+        width = max(itertools.chain((len(m) for ms in matches for m in ms),
+                                    [] if right_header is None else [len(rest(right_header))]), default=0)
+        old_data = self.data
+        old_extras = self.extras.copy()
+        self.data = []
+        self.extras.clear()
+        # extras are indexed from the top of the table, including any header
+        offset = 0 if right_header is None else 1
+        if offset:
+            self.extras.update(0, old_extras[0])
+            more = rest(right_header)
+            self.data.append(old_data[0] + more + [''] * (width - len(more)))
+        for i, (row, ms) in enumerate(zip(body, matches)):
+            if not ms and mode == 'left':
+                ms = [[]]
+            # keep the extras with the row, or remove them if the row has gone (unless we are at the top)
+            if ms or i <= 1:
+                self.extras.update(len(self.data), old_extras[i + offset])
+            for m in ms:
+                self.data.append(row + m + ['-'] * (width - len(m)))
+        self.extras.update(len(self.data), old_extras[len(body) + offset])
+        self.cols = len(self.data[0]) if self.data else 0
+        self._measured = None
+
+    def _join_source(self, source):
+        '''Find the other table for join, and return an estimate of how many rows it has
+        (or None if we cannot tell without reading it) and an iterator for the rows,
+        or (None, None) if there is nothing called source.
+        '''
+        def rows_in(data):
+            yield from data
+
+        if source == 'stack':
+            data = self.stack[:]
+            self.stack.clear()
+            return len(data), rows_in(data)
+
+        if source in self.named_tables:
+            data = self.named_tables[source]
+            data = data.data if isinstance(data, Table) else list(list(str(x) for x in r) for r in data)
+            return len(data), rows_in(data)
+
+        if not os.path.isfile(source):
+            return None, None
+
+        def rows_from_file():
+            with open(source) as fh:
+                reader = Table()
+                yield from (item for item in reader._read_lines(fh, re.compile(r'\s\s+'), 0) if not isinstance(item, str))
+
+        # guess the number of rows in the file from the average length of our own rows
+        sample = self.data[:100]
+        average = sum(len('  '.join(r)) + 1 for r in sample) / len(sample) if sample else 1
+        return os.path.getsize(source) / average, rows_from_file()
+
     def _zipper(self, n):
         '''Put n rows side by side
         '''
@@ -1095,6 +3001,7 @@ class Table:
         first see if this is the name of something in stats
         or something from builtins that we like, if none of those ignore it with msg
         '''
+        import statistics
         if not fun_list:
             fun_list = 'total'
         else:
@@ -1106,15 +3013,21 @@ class Table:
             elif fun in "min max all any sum".split():
                 func = getattr(builtins, fun)
             elif fun == "total":
-                func = builtins.sum
+                func = self._total
             else:
                 self.messages.append(f'? {fun}')
                 continue
 
+            # the typed columns give the same answers as the Decimals for these functions
+            exact = self.numeric == 'float' or fun in ('min', 'max', 'all', 'any')
             footer = []
             for c in range(self.cols):
-                booleans, values = zip(*self.column(c))
-                decimals = list(itertools.compress(values, booleans))
+                typed = self.typed_column(c) if exact else None
+                if typed is not None and (typed.typecode == 'q' or self.numeric == 'float'):
+                    booleans, decimals = (True,), typed
+                else:
+                    booleans, values = zip(*self.column(c))
+                    decimals = list(itertools.compress(values, booleans))
                 if not any(booleans) or (c == 0 and looks_like_sequence(decimals)):
                     footer.append(fun.title())
                 else:
@@ -1136,12 +3049,13 @@ class Table:
         if not shape or self.cols < 3:
             return
 
+        import statistics
         pivot_functions_for = {
-            'wide': (builtins.sum, as_decimal),
-            'sum': (builtins.sum, as_decimal),
-            'count': (builtins.len, as_decimal),
-            'mean': (lambda a: statistics.mean(a) if a else 'NA', as_decimal),
-            'any': (builtins.any, as_decimal),
+            'wide': (self._total, self._as_number),
+            'sum': (self._total, self._as_number),
+            'count': (builtins.len, self._as_number),
+            'mean': (lambda a: statistics.mean(a) if a else 'NA', self._as_number),
+            'any': (builtins.any, self._as_number),
             'first': (lambda a: a[0] if a else '-', str),
             'string': (lambda a: a[0] if a else '-', str),
             'last': (lambda a: a[-1] if a else '-', str),
@@ -1200,7 +3114,7 @@ class Table:
             for n, v in zip(names, r[keystop:]):
                 self.append(r[:keystop] + [n, v])
 
-    def _get_expr_list(self, given):
+    def _get_expr_list(self, given, cols=None):
         '''Turn the user's argument into a tuple of expression strings
 
         >>> t = Table()
@@ -1239,15 +3153,19 @@ class Table:
         ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', '(d/e)']
         >>> t._get_expr_list("(a..c/2)")
         ['(a/2)', '(b/2)', '(c/2)']
+        >>> t._get_expr_list("xyz", 4)
+        ['b', 'c', 'd']
         '''
-        identity = string.ascii_lowercase[:self.cols]
+        if cols is None:
+            cols = self.cols
+        identity = string.ascii_lowercase[:cols]
         in_parens = 0
         out = []
         expr = []
 
         # Allow counting from the right (but only xxyz)
         # only for simple_rearrangement here -- this shold probably refactor to there...
-        if '(' not in given and self.cols < 22:
+        if '(' not in given and cols < 22:
             for a, b in zip("zyxw", reversed(identity)):
                 given = given.replace(a, b)
                 given = given.replace(a.upper(), b.upper())
@@ -1313,7 +3231,7 @@ class Table:
 
         # do the work
         self._calculate_data(perm)
-        self.cols = len(self.data[0])
+        self.cols = len(self.data[0]) if self.data else 0
 
         # restore the stack
         for _ in range(stack_rows):
@@ -1323,55 +3241,83 @@ class Table:
     def _calculate_data(self, raw_perm):
         '''Do the work for "arr"
         '''
+        # the fast engine can only do calculations, not deletions or simple rearrangements
+        if self.engine == 'numpy' and raw_perm[0] != '-':
+            expressions = self._get_expr_list(raw_perm)
+            if not all(len(x) == 1 and x in string.ascii_lowercase[:self.cols] + '?' for x in expressions):
+                columns = self._vectorized_columns(expressions)
+                if columns is not None:
+                    self.data = list(list(r) for r in zip(*columns))
+                    return
+
+        calculating, calculate = self._row_calculator(raw_perm, self.cols, self.data)
+        if calculate is None:
+            return
+
+        if not calculating:
+            self.data = list(calculate(r) for r in self.data)
+            return
+
+        old_data = self.data.copy()
+        self.data.clear()
+        self.cols = 0
+        for r in old_data:
+            self.append(calculate(r))
 
+    def _row_calculator(self, raw_perm, cols, data=None):
+        '''Turn an arr perm into a function that takes a row and returns the new row.
+        Returns (calculating, function) where calculating is False for simple deletions
+        or rearrangements.  If the perm is no good, the function is None, and there
+        will be a message.  The totals are only worked out if we are given the data.
+        '''
         # do deletions first
         if raw_perm[0] == '-':
             if all(c in string.ascii_lowercase for c in raw_perm[1:]):
-                delenda = list(ord(x) - ord('a') for x in self._get_expr_list(raw_perm))
-                self.data = list(list(x for i, x in enumerate(r) if i not in delenda) for r in self.data)
-            else:
-                self.messages.append("Only lowercase ASCII allowed after -")
-            return
+                delenda = list(ord(x) - ord('a') for x in self._get_expr_list(raw_perm, cols))
+                return (False, lambda r: list(x for i, x in enumerate(r) if i not in delenda))
+            self.messages.append("Only lowercase ASCII allowed after -")
+            return (False, None)
 
         # fix up xyz etc and split up the perm into expressions
-        expressions = self._get_expr_list(raw_perm)
-        identity = string.ascii_lowercase[:self.cols]
+        expressions = self._get_expr_list(raw_perm, cols)
+        identity = string.ascii_lowercase[:cols]
 
         def _get_value(row, c):
             '''Find a suitable value given the perm character and a row of data
             '''
-            return str(random.random()) if c == '?' else row[ord(c) - ord('a')]
+            if c == '?':
+                import random
+                return str(random.random())
+            return row[ord(c) - ord('a')]
 
         # simple case of re-arrangement and/or random values
         if all(len(x) == 1 and x in identity + '?' for x in expressions):
-            self.data = list(list(_get_value(r, x) for x in expressions) for r in self.data)
-            return
+            return (False, lambda r: list(_get_value(r, x) for x in expressions))
 
         # now we have to calculate at least one cell
         desiderata = []
         for x in expressions:
-            ok, cc = compile_as_decimal(x)
+            ok, cc = compile_as_decimal(x, self.numeric != 'float')
             if not ok:
                 self.messages.append(cc)
-                return
+                return (True, None)
             desiderata.append((cc, x))
 
         values = {
-            "rows": len(self.data),
-            "cols": self.cols,
-            "total": sum(as_decimal(x) for row in self.data for x in row),
+            "rows": 0,
+            "cols": cols,
+            "total": 0,
             "row_number": 0,
         }
+        if data is not None:
+            values['rows'] = len(data)
+            values['total'] = self._total(self._as_number(x) for row in data for x in row)
         for k in identity:
             values[k.upper()] = 0  # accumulators
 
-        old_data = self.data.copy()
-        self.data.clear()
-        self.cols = 0
-
-        for r in old_data:
+        def _calculate(r):
             for k, v in zip(identity, r):
-                flag, values[k] = is_as_number(v)
+                flag, values[k] = self._number(v)
                 if flag:
                     values[k.upper()] += values[k]
 
@@ -1383,12 +3329,12 @@ class Table:
 
             # and note the line number
             values['row_number'] += 1
-            values['row_total'] = sum(as_decimal(x) for x in r)
+            values['row_total'] = self._total(self._as_number(x) for x in r)
 
             new_row = []
             for compiled_code, literal_code in desiderata:
                 try:
-                    new_value = eval(compiled_code, Panther, values)
+                    new_value = eval(compiled_code, self._functions, values)
                     if isinstance(new_value, tuple):
                         new_row.extend(new_value)
                     elif isinstance(new_value, str) and re.search(r'\*\d', literal_code):
@@ -1396,11 +3342,13 @@ class Table:
                         new_row.append(_replace_values(literal_code, values))
                     else:
                         new_row.append(new_value)
-                except (ValueError, TypeError, NameError, AttributeError, decimal.InvalidOperation):
+                except (ValueError, TypeError, NameError, AttributeError, OverflowError, decimal.InvalidOperation):
                     new_row.append(_replace_values(literal_code, values))
                 except ZeroDivisionError:
                     new_row.append("-")
-            self.append(new_row)
+            return new_row
+
+        return (True, _calculate)
 
     def _fancy_col_index(self, col_spec):
         '''Find me an index, returns index + T/F to say if letter was upper case
@@ -1453,16 +3401,35 @@ class Table:
             try:
                 i = int(col_spec)
             except ValueError:
-                for col in col_spec[::-1]:
-                    c, want_reverse = self._fancy_col_index(col)
-                    self.data.sort(key=lambda row: as_numeric_tuple(row[c], want_reverse), reverse=want_reverse)
+                if self._sqlite_ready(col_spec):
+                    self.data[:] = self._sqlite_mirror().sort(list(self._fancy_col_index(col) for col in col_spec))
+                else:
+                    for col in col_spec[::-1]:
+                        c, want_reverse = self._fancy_col_index(col)
+                        self._sort_on_column(c, want_reverse)
             else:
                 if -self.cols <= i < self.cols:
-                    self.data.sort(key=lambda row: as_numeric_tuple(row[i], False))
+                    self._sort_on_column(i % self.cols, False)
 
         if header is not None:
             self.insert(0, header)
 
+    def _sort_on_column(self, c, want_reverse):
+        '''Sort the rows on column c, using the typed column if there is one,
+        which gives the same order as as_numeric_tuple without looking at the text
+        '''
+        typed = self.typed_column(c)
+        if typed is None:
+            self.data.sort(key=_sort_key(c, want_reverse), reverse=want_reverse)
+        else:
+            if typed.typecode == 'q':
+                key = typed.__getitem__
+            else:
+                key = lambda k: (typed[k], self.data[k][c].upper())  # noqa: E731
+            order = sorted(range(len(self.data)), key=key, reverse=want_reverse)
+            self.data[:] = [self.data[k] for k in order]
+            self._move_typed(lambda a: map(a.__getitem__, order))
+
     def _remove_duplicates_by_col(self, col_spec):
         '''like uniq, remove row if key cols match the row above
         '''
@@ -1481,7 +3448,10 @@ class Table:
                     continue
                 cols_to_check.append(i)
 
-        if cols_to_check:
+        if cols_to_check and self._sqlite_ready(col_spec):
+            self.data[:] = self._sqlite_mirror().uniq(cols_to_check)
+
+        elif cols_to_check:
             rows_to_delete = []
             previous_t = ''
             for i, row in enumerate(self.data):
@@ -1497,6 +3467,48 @@ class Table:
         if header is not None:
             self.insert(0, header)
 
+    def _sort_and_remove_duplicates(self, col_spec):
+        '''Do sort X + uniq X in one grouping pass.  Rows with the same sort
+        keys are collected into buckets in their original order, so we only
+        have to sort the buckets, and then drop the duplicates on the way out.
+        This is what the planner puts in place of the two separate steps.
+        '''
+        header = None
+        if '@' in col_spec:
+            header = self.pop(0)
+            col_spec = col_spec.replace('@', '')
+
+        if not col_spec:
+            col_spec = string.ascii_lowercase[:self.cols]
+
+        keys = []
+        for col in col_spec:
+            c, want_reverse = self._fancy_col_index(col)
+            if c is None:
+                continue
+            keys.append((c, want_reverse))
+
+        sort_keys = list(_sort_key(c, want_reverse) for c, want_reverse in keys)
+        buckets = collections.defaultdict(list)
+        for row in self.data:
+            buckets[tuple(key(row) for key in sort_keys)].append(row)
+
+        order = list(buckets)
+        for k in range(len(keys) - 1, -1, -1):
+            order.sort(key=lambda t: t[k], reverse=keys[k][1])
+
+        self.data = []
+        previous_t = ''
+        for t in order:
+            for row in buckets[t]:
+                this_t = ' '.join(row[c] for c, _ in keys)
+                if previous_t != this_t:
+                    self.data.append(row)
+                    previous_t = this_t
+
+        if header is not None:
+            self.insert(0, header)
+
     def _add_grouping_blanks(self, col_spec):
         '''Add blanks to show groups in given column
         '''
@@ -1513,7 +3525,7 @@ class Table:
         for i, row in enumerate(self.data):
             this_tag = ' '.join(row[j] for j in cols_to_check)
             if i > 0 and this_tag != last_tag and not self.extras[i]:
-                self.extras[i].add("blank")
+                self.extras.add(i, "blank")
             last_tag = this_tag
 
     def _show_column_counts(self, col_spec):
@@ -1565,17 +3577,76 @@ class Table:
         if header is not None:
             self.insert(0, header)
 
-    def tabulate(self):
-        '''Generate nicely lined up rows
+    def _measure_spilled_columns(self):
+        "Work out the widths and alignments from the spilled rows, allowing for the filled out ones"
+        widths = list(self._widths)
+        numbers = list(self._numbers)
+        filler_is_a_number = self._number(self._filler)[0]
+        for j, present in enumerate(self._present):
+            if present < self._spilled:
+                widths[j] = max(widths[j], len(self._filler))
+                if filler_is_a_number:
+                    numbers[j] += self._spilled - present
+        return widths, list('>' if 2 * n > self._spilled else '<' for n in numbers)
+
+    def _measure_columns(self):
+        '''Find the width of each column, and whether it should be aligned to the right
+        because most of the values are numbers.  These are kept up to date as rows are
+        inserted, so we only need to go through all the rows after other changes.
         '''
-        # this roundabout approach makes tabulate more consistent
-        # for speed you could make csv write directly to sys.stdout
-        if self.form == 'csv':
+        if self._measured != len(self.data) or len(self._widths) != self.cols:
+            self._widths = [0] * self.cols
+            self._numbers = [0] * self.cols
+            self._measured = 0
+            for row in self.data:
+                self._count_row(row)
+        aligns = list('>' if 2 * n > len(self.data) else '<' for n in self._numbers)
+        return self._widths, aligns
+
+    def _count_row(self, row):
+        "Add the widths and numbers in one row to the column measurements"
+        for j, cell in enumerate(row):
+            if len(cell) > self._widths[j]:
+                self._widths[j] = len(cell)
+            if self._number(cell)[0]:
+                self._numbers[j] += 1
+        self._measured += 1
+
+    def tabulate(self, start=None, stop=None):
+        '''Generate nicely lined up rows, or just the rows from start to stop
+        (and any special rows in front of them), lined up as for the whole table
+        '''
+        return self._lines(self.form, start, stop)
+
+    def write(self, fileobj, form=None):
+        '''Write any messages and then the table to a file object, one line at a time,
+        in the given form or the current form.  Returns the number of lines written.
+        '''
+        count = 0
+        for line in itertools.chain(self.messages, self._lines(form or self.form)):
+            fileobj.write(line + '\n')
+            count += 1
+        self.messages.clear()
+        return count
+
+    def _lines(self, form, start=None, stop=None):
+        '''Generate the lines of the table in the given form, for the rows from start to stop
+        '''
+        if self._spill is not None:
+            rows = itertools.islice(self._unspill(), *slice(start, stop).indices(self._spilled))
+        else:
+            rows = ((self.extras[i], self.data[i]) for i in range(*slice(start, stop).indices(len(self.data))))
+
+        if form == 'csv':
+            # use the csv module one row at a time, to get the quoting right
+            import csv
             out = io.StringIO()
             w = csv.writer(out, lineterminator=os.linesep)
-            w.writerows(self.data)
-            for line in out.getvalue().splitlines():
-                yield line
+            for _, row in rows:
+                w.writerow(row)
+                yield from out.getvalue().splitlines()
+                out.seek(0)
+                out.truncate()
             out.close()
             return
 
@@ -1584,21 +3655,21 @@ class Table:
         blank_line = None
         comment_marker = None
         ruler = None
-        if self.form == 'tex':
+        if form == 'tex':
             separator = ' & '
             eol_marker = ' \\cr'
             comment_marker = '%'
             blank_line = "\\noalign{\\medskip}"
             ruler = "\\noalign{\\vskip2pt\\hrule\\vskip4pt}"
-        elif self.form == 'latex':
+        elif form == 'latex':
             separator = ' & '
             eol_marker = ' \\\\'
             comment_marker = '%'
             blank_line = "\\noalign{\\medskip}"
             ruler = "\\hline"
-        elif self.form == 'tsv':
+        elif form == 'tsv':
             separator = '\t'
-        elif self.form == 'pipe':
+        elif form == 'pipe':
             separator = ' | '
             ruler = 'piped'
         else:
@@ -1606,11 +3677,7 @@ class Table:
             comment_marker = '#'
             ruler = 'plain'
 
-        widths = [max(len(row[i]) for row in self.data) for i in range(self.cols)]
-        aligns = []
-        for i in range(self.cols):
-            booleans, _ = zip(*self.column(i))
-            aligns.append('>' if sum(booleans) / len(booleans) > 0.5 else '<')
+        widths, aligns = self._measure_columns() if self._spill is None else self._measure_spilled_columns()
 
         def _pipe_rule(w, a):
             '''A rule for piped format, given width and alignment
@@ -1618,8 +3685,8 @@ class Table:
             return '-' * (w - 1) + (':' if a == '>' else '-')
 
         # generate nicely lined up rows
-        for i, row in enumerate(self.data):
-            for ex in self.extras[i]:
+        for markers, row in rows:
+            for ex in markers:
                 if ex == 'rule' and ruler is not None:
                     if ruler == "plain":
                         yield ' ' * self.indent \
@@ -1642,76 +3709,402 @@ class Table:
             yield ' ' * self.indent + separator.join(out).rstrip() + eol_marker  # no trailing blanks
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
+def _command_line_parser():
+    "The argument parser for the command line"
+    import argparse
+    parser = argparse.ArgumentParser(prog='tabulate.py')
     parser.add_argument("agenda", nargs='*', help="[delimiter.maxsplit] [verb [option]]...")
-    parser.add_argument("--file", help="Source file name, defaults to STDIN")
-    args = parser.parse_args()
+    parser.add_argument("--file", action="append",
+                        help="Source file name or glob, defaults to STDIN; give more than one for a batch")
+    parser.add_argument("--out", metavar="PATTERN",
+                        help="Write each batch file to PATTERN with {dir} {name} {stem} filled in")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(),
+                        help="How many processes to use for a batch (default one per core)")
+    parser.add_argument("--engine", choices=('decimal', 'numpy', 'sqlite'), default='decimal',
+                        help="Use NumPy floats for simple arithmetic in arr and tap, or SQLite for sort, uniq and filter")
+    parser.add_argument("--numeric", choices=('decimal', 'float'), default='decimal',
+                        help="Do all the arithmetic with floats instead of Decimals")
+    parser.add_argument("--optimize", action="store_true", help="Rewrite the agenda so that it runs faster")
+    parser.add_argument("--stream", action="store_true", help="Do any row-local verbs as the input is read")
+    parser.add_argument("--spill", action="store_true", help="Keep the rows in a temporary file, not in memory")
+    parser.add_argument("--diff", choices=('ed', 'unified'), help="Show the changes to the input as an edit script")
+    parser.add_argument("--follow", action="store_true", help="Keep reading lines as they are added to the file")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="Seconds between looks at the file with --follow (default 1)")
+    parser.add_argument("--serve", metavar="SOCKET", help="Run as a daemon for tab_client.py on this Unix socket")
+    parser.add_argument("--idle", type=float, default=600, help="Seconds before an idle daemon stops (default 600)")
+    return parser
+
+
+def main(argv=None, stdin=None, stdout=None):
+    '''Do what the command line asks: argv is the list of arguments (default sys.argv[1:]),
+    and the table is read from stdin and written to stdout (default the real ones).
+    '''
+    stdin = sys.stdin if stdin is None else stdin
+    stdout = sys.stdout if stdout is None else stdout
+    parser = _command_line_parser()
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        try:
+            serve(args.serve, args.idle)
+        except PermissionError as e:
+            parser.error(f'--serve {e}')
+        return
 
-    # Join the agenda args into one string, remove any backslash (for Vim),
-    # do shorthands and split into a list
-    agenda = ' '.join(args.agenda).replace('\\', '')
-    agenda = agenda.split()
+    names = _source_files(args.file or [])
+    if args.file and not names:
+        parser.error(f"no files match {' '.join(args.file)}")
 
-    # Get the delimiter from the agenda if possible
-    try:
-        delim = agenda.pop(0)
-    except IndexError:
-        delim = None
+    if args.follow:
+        if len(names) != 1 or args.out or args.diff or args.spill:
+            parser.error("--follow needs one --file, and does not work with --out, --diff, or --spill")
+        _follow_file(args, names[0], stdout)
+        return
+
+    if len(names) > 1 or args.out:
+        for output in _batch(args, names):
+            stdout.write(output)
+        return
+
+    if names:
+        with open(names[0]) as fh:
+            _tabulate_file(args, fh, stdout)
     else:
-        # If the removed delim is starts with alphabetic, put it back and reset delim to None
-        if re.match(r'^[a-zA-Z]', delim):
-            agenda.insert(0, delim)
-            delim = None
+        _tabulate_file(args, io.StringIO("") if stdin.isatty() else stdin, stdout)
 
-    table = Table()
-    fh = open(args.file) if args.file else io.StringIO("" if sys.stdin.isatty() else sys.stdin.read())
 
-    if delim is None:
-        first_line = fh.readline().strip()
+def _source_files(patterns):
+    '''Expand any globs in the list of --file patterns, keeping the order given.
+    A name without any wild cards is kept even if it does not exist,
+    so that we get the usual error when we try to open it.
+
+    >>> _source_files(['tabulate.py', 'no-such-file.txt', 'no-such-*.txt'])
+    ['tabulate.py', 'no-such-file.txt']
+    '''
+    import glob
+    names = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            names.extend(sorted(glob.glob(pattern)))
+        else:
+            names.append(pattern)
+    return names
+
+
+def _batch(args, names):
+    '''Do the agenda to each of the named files, with a pool of args.jobs processes,
+    and yield the outputs in the order of the names.  Each worker keeps its compiled
+    expressions and the numbers it has seen from one file to the next.
+    '''
+    work = functools.partial(_batch_file, args)
+    if args.jobs is None or args.jobs < 2 or len(names) < 2:
+        yield from map(work, names)
+        return
+
+    import concurrent.futures
+    jobs = min(args.jobs, len(names))
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(work, names, chunksize=max(1, len(names) // (4 * jobs)))
+
+
+def _batch_file(args, name):
+    '''Do the agenda to one file of a batch, and write the result to the --out file,
+    or return it as a string if there is no --out pattern.
+    '''
+    out = io.StringIO()
+    with open(name) as fh:
+        _tabulate_file(args, fh, out)
+    if not args.out:
+        return out.getvalue()
+
+    folder, base = os.path.split(name)
+    target = args.out.format(dir=folder or '.', name=base, stem=os.path.splitext(base)[0])
+    if os.path.abspath(target) == os.path.abspath(name):
+        raise ValueError(f'--out would overwrite {name}')
+    with open(target, 'w') as fh:
+        fh.write(out.getvalue())
+    return ''
+
+
+def _follow_lines(fh, pause, interval=1.0, polls=None):
+    '''Generate the lines of an open file, and when we get to the end, call pause() and
+    then wait for more lines to be added, like "tail -f".  A part line at the end
+    is kept back until the rest of it arrives.  If the file is truncated, we start
+    again from the top.  With polls=n we stop after n quiet spells in a row.
+    '''
+    import time
+    part = ''
+    quiet = 0
+    while polls is None or quiet < polls:
+        line = fh.readline()
+        if line:
+            part += line
+            if part.endswith('\n'):
+                yield part
+                part = ''
+                quiet = 0
+            continue
+        pause()
+        quiet += 1
+        time.sleep(interval)
+        if fh.tell() > os.fstat(fh.fileno()).st_size:
+            fh.seek(0)
+            part = ''
+    if part:
+        yield part
+
+
+def _follow_file(args, name, stdout, polls=None):
+    '''Show the table in a growing file, and keep it up to date as lines are added.
+    The row-local verbs at the front of the agenda are done to each new row once,
+    as it is read; any other verbs are done again to the whole table each time.
+    When we only have row-local verbs and the columns are still the same width,
+    the new rows are just written out below the old ones, otherwise the whole
+    table is written out again (after clearing the screen if we are on a terminal).
+    With polls=n we stop when nothing has been added for n intervals.
+    '''
+    parser = _command_line_parser()
+    delim, agenda = _delimiter_and_agenda(args.agenda)
+    table = Table(engine=args.engine, numeric=args.numeric, optimize=args.optimize)
+    if 'undo' in agenda or 'redo' in agenda:
+        parser.error("--follow cannot undo, because it only keeps the latest table")
+
+    # everything that streams, except sample, which only gives up its rows at the end
+    live = []
+    for op, function, argument in table._parse_agenda(agenda):
+        if op == 'sample' or not table._streamable(op, function, argument):
+            break
+        live.append(op)
+        live.extend(argument.split())
+    rest = agenda[len(live):]
+
+    with open(name) as fh:
+        sample = list(itertools.islice(iter(fh.readline, ''), 64))
         fh.seek(0)
-        # guess delim from content: tex & latex & pipe |
-        if first_line.count('&') > 0 and first_line.endswith("\\cr"):
-            table.parse_tex(fh)
-            table.do('make tex')
+        source, in_sep, cell_limit = _sniff_source(delim, sample)
+        if source != 'lines':
+            parser.error("--follow only works with plain text tables")
+
+        clear = '\x1b[H\x1b[2J' if stdout.isatty() else ''
+        shown = (0, None)  # how many rows we have shown, and how they were laid out
+
+        def show():
+            nonlocal shown
+            if rest:
+                # the other verbs might change any of the table, so do them all again
+                layout = (len(table.data), list(table.extras.items()))
+                if layout == shown[1]:
+                    return
+                view = Table(engine=args.engine, numeric=args.numeric, optimize=args.optimize)
+                view._restore(table._snapshot())
+                view.indent = table.indent
+                view.do(rest)
+                again = True
+                lines = view.tabulate()
+            else:
+                widths, aligns = table._measure_columns()
+                layout = (list(widths), aligns, table.indent)
+                again = layout != shown[1]
+                if not again and shown[0] == len(table.data):
+                    return
+                lines = table.tabulate(0 if again else shown[0], len(table.data))
+
+            if again and shown[0]:
+                stdout.write(clear)
+            for line in lines:
+                stdout.write(line + '\n')
+            stdout.flush()
+            shown = (len(table.data), layout)
+
+        lines = _follow_lines(fh, show, args.interval, polls)
+        table.parse_lines(lines, splitter=in_sep, splits=cell_limit, agenda=live)
+        show()
+
+
+def _delimiter_and_agenda(words):
+    '''Join the agenda args into one string, remove any backslash (for Vim),
+    and split into a list, taking off the delimiter from the front if there is one.
+
+    >>> _delimiter_and_agenda(['1', 'sort', 'a\\\\'])
+    ('1', ['sort', 'a'])
+    >>> _delimiter_and_agenda(['sort a'])
+    (None, ['sort', 'a'])
+    '''
+    agenda = ' '.join(words).replace('\\', '').split()
 
-        elif first_line.count('&') > 0 and first_line.endswith("\\\\"):
-            table.parse_tex(fh)
-            table.do('make latex')
+    # If the first word starts with something alphabetic, it's a verb, not a delimiter
+    if not agenda or re.match(r'^[a-zA-Z]', agenda[0]):
+        return None, agenda
+    return agenda[0], agenda[1:]
 
-        elif first_line.count('|') > 2:
-            table.parse_lines(fh, splitter=re.compile(r'\s*\|\s*'))
 
-        else:
-            table.parse_lines(fh, splitter=re.compile(r'\s{2,}'))
+def _tabulate_file(args, fh, stdout):
+    "Read a table from fh, do the agenda from args to it, and write it to stdout"
+    delim, agenda = _delimiter_and_agenda(args.agenda)
+
+    # undo needs the whole table to go back to (the table keeps snapshots while it does an
+    # agenda with an undo in it), so then we cannot do any of the verbs early as we read the input
+    rewinding = 'undo' in agenda
+    table = Table(engine=args.engine, numeric=args.numeric, optimize=args.optimize)
 
-    elif delim == ',':
+    # work out what sort of input we have
+    sample, lines = _peek_lines(fh, 64)
+
+    # keep a copy of the input lines if we are going to compare them with the output
+    if args.diff:
+        input_lines = []
+        lines = (input_lines.append(line.rstrip('\n')) or line for line in lines)
+    source, in_sep, cell_limit = _sniff_source(delim, sample)
+    if source == 'csv':
+        import csv
         try:
-            dialect = csv.Sniffer().sniff(fh.read(1024))
-            fh.seek(0)
-            table.parse_lol(csv.reader(fh, dialect), filler='-')
+            dialect, filler = csv.Sniffer().sniff(''.join(sample)[:1024]), '-'
         except csv.Error:
-            fh.seek(0)
-            table.parse_lol(csv.reader(fh))
-
+            dialect, filler = csv.excel, ''
+
+    # if the agenda starts by picking out some columns from plain space-separated input,
+    # then we can do that as we split up the lines, as long as the columns are there in the sample
+    fields = skip = None
+    if source == 'lines' and in_sep.pattern.startswith(r'\s{') and cell_limit == 0 and not rewinding:
+        cols = max((len(r) for r in table._read_lines(sample, in_sep, 0) if not isinstance(r, str)), default=0)
+        projection = table._pushable_projection(agenda, cols)
+        if projection is not None:
+            fields, skip, words = projection
+            agenda = agenda[len(words):]
+
+    # with --stream the parse methods do the row-local verbs at the front and give us back the rest,
+    # otherwise we can still do a simple filter at the front as we read
+    # and if there is a head near the front we can stop reading early
+    # (but only if the filter uses columns in the first row, since the rest might be ragged)
+    if rewinding:
+        streaming = None
+    elif args.stream:
+        streaming = agenda
     else:
-        # check for a maxsplit spec ".3", "2.4" etc
-        mm = re.match(r'(\d*)\.(\d+)', delim)
-        if mm is not None:
-            delim = mm.group(1)
-            if delim == '':
-                delim = '2'
-            cell_limit = int(mm.group(2))
+        if source == 'csv':
+            items = table._read_lol(csv.reader(sample, dialect))
+        elif source == 'lines':
+            items = table._read_lines(sample, in_sep, cell_limit, fields, skip)
         else:
-            cell_limit = 0
-        if delim.isdigit():
-            in_sep = re.compile(rf'\s{{{delim},}}')
-        else:
-            in_sep = re.compile(re.escape(delim))
-        table.parse_lines(fh, splitter=in_sep, splits=cell_limit)
+            items = table._read_tex(sample)
+        cols, _ = _peek_width(items)
+        streaming = table._pushable_head(agenda, cols) or table._pushable_filter(agenda, cols)
+
+    # with --spill all the verbs have to be done as we read, because the rows go straight to disk
+    if args.spill:
+        if not table._spillable(agenda):
+            _command_line_parser().error("--spill only works with verbs that can be streamed, and make")
+        import tempfile
+        table.spill(tempfile.TemporaryFile())
+        streaming = agenda
+
+    if source == 'tex' or source == 'latex':
+        rest = table.parse_tex(lines, agenda=streaming)
+        table.do('make ' + source)
+
+    elif source == 'csv':
+        rest = table.parse_lol(csv.reader(lines, dialect), filler=filler, agenda=streaming)
 
-    table.do(agenda)
-    print(table)
+    else:
+        rest = table.parse_lines(lines, splitter=in_sep, splits=cell_limit, agenda=streaming, fields=fields, skip=skip)
+
+    table.do(agenda if streaming is None else rest + agenda[len(streaming):])
+
+    if args.diff:
+        collections.deque(lines, maxlen=0)  # read the rest, in case we stopped early
+        for line in edit_script(input_lines, str(table).splitlines(), args.diff):
+            print(line, file=stdout)
+
+    # write the output a line at a time, but make sure there is at least an empty line
+    elif table.write(stdout) == 0:
+        print(file=stdout)
 
-    if args.file is not None:
-        fh.close()
+
+def _socket_problem(path):
+    '''What is wrong with using the Unix socket at path, or None if nothing is.  It must be
+    ours and only ours, in a folder that nobody else can put another socket in (or in a
+    sticky folder like /tmp, where they cannot remove ours).  tab_client.py checks the same.
+    '''
+    import stat
+    folder = os.stat(os.path.dirname(os.path.abspath(path)))
+    if folder.st_uid not in (0, os.getuid()) or folder.st_mode & 0o022 and not folder.st_mode & stat.S_ISVTX:
+        return f'other users can change the folder of {path}'
+    try:
+        info = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        return f'{path} is not a socket that only you can use'
+    return None
+
+
+def serve(path, idle=600):
+    '''Run as a daemon listening on a Unix socket at path, doing one command line for
+    each connection from tab_client.py, until nothing has come in for idle seconds.
+    The imports, the compiled expressions, and the numbers we have seen stay warm
+    between calls, which is most of the time for a small table from an editor.
+
+    A request is a line of JSON with "argv" and "cwd", followed by the input table.
+    The reply is a line of JSON with "status" and "stderr", followed by the output.
+    '''
+    import contextlib
+    import json
+    import socket
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        "Do one command line"
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            out, err = io.StringIO(), io.StringIO()
+            status = 0
+            with contextlib.redirect_stderr(err):
+                try:
+                    if '--serve' in request['argv']:
+                        raise ValueError('the daemon is already running')
+                    if '--follow' in request['argv']:
+                        raise ValueError('the daemon cannot --follow a file, run tabulate.py directly')
+                    os.chdir(request['cwd'])
+                    main(request['argv'], io.TextIOWrapper(self.rfile, encoding='utf-8'), out)
+                except SystemExit as e:  # from argparse
+                    status = e.code if isinstance(e.code, int) else 1
+                except Exception as e:  # pylint: disable=broad-except
+                    print(f'tabulate.py: {e!r}', file=sys.stderr)
+                    status = 1
+            self.wfile.write(json.dumps({'status': status, 'stderr': err.getvalue()}).encode('utf-8') + b'\n')
+            self.wfile.write(out.getvalue().encode('utf-8'))
+
+    try:
+        os.mkdir(os.path.dirname(os.path.abspath(path)), 0o700)  # a private folder, like $XDG_RUNTIME_DIR
+    except FileExistsError:
+        pass
+    problem = _socket_problem(path)
+    if problem:
+        raise PermissionError(problem)
+
+    try:
+        with socket.socket(socket.AF_UNIX) as probe:
+            probe.connect(path)
+        return  # there is a daemon there already, and it is ours
+    except OSError:
+        if os.path.exists(path):
+            os.unlink(path)  # left over from a daemon that died
+
+    mask = os.umask(0o077)  # only this user can connect
+    try:
+        server = socketserver.UnixStreamServer(path, Handler)
+    finally:
+        os.umask(mask)
+
+    with server:
+        server.timeout = idle
+        server.idle = False
+        server.handle_timeout = lambda: setattr(server, 'idle', True)
+        while not server.idle:
+            server.handle_request()
+    os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
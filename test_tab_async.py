@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+import asyncio
+import unittest
+
+import tabulate
+
+
+class TestTableAsync(unittest.TestCase):
+
+    def setUp(self):
+        self.towns = '''
+Town        Pop   Area
+------------------------
+Oxford      152   45.6
+Cambridge   145   40.7
+"           3     0.1
+# small ones
+Ely         20    59
+"           1.5   1.2
+New Romney  6.5   5.4
+'''.strip().splitlines()
+
+    @staticmethod
+    async def arrive(things, pause=0):
+        "An async iterable, like rows coming in from the network"
+        for thing in things:
+            await asyncio.sleep(pause)
+            yield thing
+
+    def test_same_as_parse(self):
+        for agenda in (None, 'filter b>10 sort c', 'ditto dp 1 add', 'filter row_number>2 head 3'):
+            whole = tabulate.Table()
+            rest = whole.parse_lines(self.towns, agenda=agenda)
+            whole.do(rest)
+
+            tab = tabulate.Table()
+            rest = asyncio.run(tab.aparse_lines(self.arrive(self.towns), agenda=agenda))
+            asyncio.run(tab.ado(rest))
+            self.assertEqual(str(tab), str(whole), agenda)
+
+    def test_decimal_context(self):
+        "The worker threads should work to the same precision as the table"
+        for agenda in ('arr a(b/3)', 'arr a(c/7) sort b'):
+            whole = tabulate.Table()
+            whole.parse_lines(self.towns)
+            whole.do(agenda)
+
+            tab = tabulate.Table()
+            tab.parse_lines(self.towns)
+            asyncio.run(tab.ado(agenda))
+            self.assertEqual(str(tab), str(whole), agenda)
+
+            tab = tabulate.Table()
+            rest = asyncio.run(tab.aparse_lines(self.arrive(self.towns), agenda=agenda))
+            self.assertEqual(rest, agenda.split()[2:])
+            tab.do(rest)
+            self.assertEqual(str(tab), str(whole), agenda)
+
+    def test_many_batches(self):
+        rows = ([str(i), str(i * i)] for i in range(5000))
+        tab = tabulate.Table()
+        rest = asyncio.run(tab.aparse_lol(self.arrive(rows), agenda='filter b>1000 head 2000 add'))
+        self.assertEqual(rest, ['add'])
+        self.assertEqual(len(tab), 2000)
+        self.assertEqual(tab[0], ['32', '1024'])
+
+    def test_stays_responsive(self):
+        async def service():
+            ticks = 0
+            tab = tabulate.Table()
+            work = asyncio.ensure_future(tab.ado('gen 20000 arr a(a*a) sort A'))
+            while not work.done():
+                ticks += 1
+                await asyncio.sleep(0.001)
+            await work
+            return ticks, tab
+
+        ticks, tab = asyncio.run(service())
+        self.assertGreater(ticks, 1)
+        self.assertEqual(tab[0], ['20000', '400000000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
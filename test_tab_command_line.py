@@ -1,8 +1,17 @@
 #! /usr/bin/env python3
 
+import contextlib
+import io
+import os
+import socket
 import subprocess
+import tempfile
+import time
 import unittest
 
+import tabulate
+import tab_client
+
 
 class TestTableScript(unittest.TestCase):
 
@@ -35,3 +44,159 @@ G        582   61.650
 ---------------------
 Total   3909  536.012
 '''.lstrip())
+
+    def test_diff(self):
+        '''Show the changes as an edit script'''
+        cmd = 'python3 tabulate.py --file test-input.txt --diff ed 1 filter b<300'.split()
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(cp.stdout.decode('utf-8'), '''
+2,9c
+x  Price    Val
+A    180  14.42
+F    219   42.5
+.
+'''.lstrip())
+
+    def test_undo(self):
+        '''Undo needs the whole input, even when we could have filtered it as we read'''
+        cmd = 'python3 tabulate.py --file test-input.txt --stream 1 filter b<300 undo head @2'.split()
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(cp.stdout.decode('utf-8'), '''
+# Don't change this file!
+x  Price    Val
+A    180  14.42
+B    869  171.7
+'''.lstrip())
+
+    def test_main(self):
+        '''Run the command line without starting Python again'''
+        out = io.StringIO()
+        tabulate.main(['gen', '6', 'wrap', '3'], io.StringIO(''), out)
+        self.assertEqual(out.getvalue(), '1  3  5\n2  4  6\n')
+
+    def test_batch(self):
+        '''Do the same agenda to several files, in order'''
+        one = "# Don't change this file!\nx  Price    Val\nA    180  14.42\nF    219   42.5\n"
+        cmd = 'python3 tabulate.py --file test-input.txt --file test-inp*.txt --jobs 2 1 filter b<300 arr abc'.split()
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(cp.stdout.decode('utf-8'), one + one)
+
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('a.txt', 'b.txt'):
+                with open(os.path.join(folder, name), 'w') as fh:
+                    fh.write(f'{name}  1\n')
+            out = io.StringIO()
+            tabulate.main(['--file', os.path.join(folder, '*.txt'), '--out', '{dir}/{stem}.out', 'add'], stdout=out)
+            self.assertEqual(out.getvalue(), '')
+            with open(os.path.join(folder, 'b.out')) as fh:
+                self.assertEqual(fh.read(), 'b.txt  1\nTotal  1\n')
+
+    def test_follow(self):
+        '''Keep showing a file as it grows, only writing out the new rows while they fit'''
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'growing.log')
+            with open(path, 'w') as fh:
+                fh.write('a  1\nb  2\n')
+            more = ['c  3\n', 'dddd  44\n# note\n', 'e  5\n']
+
+            class Screen(io.StringIO):
+                "Add the next lines to the file each time the table has been shown"
+                def flush(self):
+                    if more:
+                        with open(path, 'a') as fh:
+                            fh.write(more.pop(0))
+
+            args = tabulate._command_line_parser().parse_args(['--follow', '--interval', '0', 'filter', 'b<50'])
+            screen = Screen()
+            tabulate._follow_file(args, path, screen, polls=2)
+            self.assertEqual(screen.getvalue(), 'a  1\nb  2\nc  3\na      1\nb      2\nc      3\ndddd  44\n# note\ne      5\n')
+
+            args = tabulate._command_line_parser().parse_args(['--interval', '0', 'sort', 'b', 'add'])
+            screen = io.StringIO()
+            tabulate._follow_file(args, path, screen, polls=1)
+            self.assertEqual(screen.getvalue(), 'a       1\nb       2\nc       3\ne       5\n# note\ndddd   44\nTotal  55\n')
+
+    def test_startup(self):
+        '''Importing tabulate should not pull in the heavy modules until a verb needs them'''
+        heavy = ('numpy', 'argparse', 'csv', 'statistics', 'tokenize', 'textwrap', 'random', 'pickle',
+                 'tempfile', 'socket', 'socketserver', 'json', 'difflib', 'ast',
+                 'tab_fun_dates', 'tab_fun_maths', 'tab_fun_useful')
+        cmd = ['python3', '-c', 'import sys, tabulate; print(" ".join(sys.modules))']
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        loaded = set(cp.stdout.decode('utf-8').split())
+        self.assertEqual(loaded.intersection(heavy), set())
+
+        # and the import itself is quick, once the bytecode has been cached
+        with tempfile.TemporaryDirectory() as folder:
+            env = dict(os.environ, PYTHONPYCACHEPREFIX=folder)
+            env.pop('PYTHONDONTWRITEBYTECODE', None)
+            times = []
+            for _ in range(4):
+                cp = subprocess.run(['python3', '-X', 'importtime', '-c', 'import tabulate'], stderr=subprocess.PIPE, env=env)
+                for line in cp.stderr.decode('utf-8').splitlines():
+                    fields = line.split('|')
+                    if fields[-1].strip() == 'tabulate':
+                        times.append(int(fields[1]))
+            # the first one compiles tabulate.py; the rest take about 12 ms on a laptop
+            self.assertLess(min(times[1:]), 40000, times)
+
+        # but they are there when we want them
+        self.assertIsNotNone(tabulate.Panther['sqrt'])
+        tab = tabulate.Table()
+        tab.parse_lines(['2021-01-04  3', '2021-01-05  4'])
+        tab.do('arr a(dow(a))(sqrt(b*b+16)) sample 2')
+        self.assertEqual(sorted(str(tab).split()), sorted('2021-01-04 Mon 5 2021-01-05 Tue 5.65685424949'.split()))
+
+    def test_daemon(self):
+        '''Send a table to a daemon and get it back'''
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'tabulate.sock')
+            daemon = subprocess.Popen(['python3', 'tabulate.py', '--serve', path, '--idle', '10'])
+            try:
+                for _ in range(100):
+                    if os.path.exists(path):
+                        break
+                    time.sleep(0.05)
+                status, errors, output = tab_client.ask(['1', 'add'], b'a 1\nb 2\n', path)
+                self.assertEqual((status, errors), (0, ''))
+                self.assertEqual(output.decode('utf-8'), 'a      1\nb      2\nTotal  3\n')
+
+                status, errors, output = tab_client.ask(['--diff', 'huh'], b'', path)
+                self.assertEqual(status, 2)
+                self.assertIn('invalid choice', errors)
+            finally:
+                daemon.terminate()
+                daemon.wait()
+
+    def test_daemon_socket(self):
+        '''Neither side uses a socket that others could have put there'''
+        with tempfile.TemporaryDirectory() as folder:
+            # a folder anyone can write in, but without the sticky bit of /tmp
+            os.chmod(folder, 0o777)
+            path = os.path.join(folder, 'tabulate.sock')
+            with self.assertRaises(PermissionError):
+                tab_client.ask(['add'], b'a 1\n', path)
+            with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                tabulate.main(['--serve', path])
+            self.assertIn('other users can change the folder', err.getvalue())
+
+            # a socket that others can connect to
+            os.chmod(folder, 0o700)
+            with socket.socket(socket.AF_UNIX) as other:
+                other.bind(path)
+                os.chmod(path, 0o777)
+                with self.assertRaises(PermissionError):
+                    tab_client.ask(['add'], b'a 1\n', path)
+                with contextlib.redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                    tabulate.main(['--serve', path])
+                self.assertIn('is not a socket that only you can use', err.getvalue())
+
+        # the private folder is made as it is needed
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'private', 'tabulate.sock')
+            tabulate.main(['--serve', path, '--idle', '0.01'])
+            self.assertEqual(os.stat(os.path.dirname(path)).st_mode & 0o777, 0o700)
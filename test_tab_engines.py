@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+"Tests for the optional NumPy engine and the float numeric mode"
+
+import unittest
+
+import tabulate
+
+
+class TestTableEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.data = [[3, 4, '1,000'], [5, 12, 20], [8, 15, 2]]
+
+    def _run(self, engine, agenda):
+        tab = tabulate.Table(engine=engine)
+        tab.parse_lol(self.data)
+        tab.do(agenda)
+        return str(tab)
+
+    @unittest.skipIf(tabulate.numpy is None, "NumPy is not installed")
+    def test_arr_matches_decimal(self):
+        for agenda in ('arr ab(a+b)', 'arr c(a*b)', 'arr (sqrt(a*a+b*b))', 'arr a(b/a)', 'arr (c/2)ba'):
+            self.assertEqual(self._run('numpy', agenda), self._run('decimal', agenda), agenda)
+
+    @unittest.skipIf(tabulate.numpy is None, "NumPy is not installed")
+    def test_tap_matches_decimal(self):
+        for agenda in ('tap +1', 'tap x*x', 'tap 2*x-1'):
+            self.assertEqual(self._run('numpy', agenda), self._run('decimal', agenda), agenda)
+
+    @unittest.skipIf(tabulate.numpy is None, "NumPy is not installed")
+    def test_floats(self):
+        self.assertEqual(self._run('numpy', 'arr (1/3)'), '''
+0.333333333333
+0.333333333333
+0.333333333333'''.strip())
+        self.data.append([0, 0.5, '43%'])
+        self.assertEqual(self._run('numpy', 'arr a(b/a)(c*2)'), '''
+3  1.33333333333  2000
+5            2.4    40
+8          1.875     4
+0              -  0.86'''.strip())
+
+    def test_vectorizable(self):
+        "Numbers in the expression are fine, whichever way this Python parses them"
+        for expr in ('(a+b)/2', '-1.5*a', 'sqrt(a)**0.5'):
+            self.assertTrue(tabulate.compile_as_numpy(expr)[0], expr)
+        for expr in ('a+True', 'a*1j', "a+'1'"):
+            self.assertFalse(tabulate.compile_as_numpy(expr)[0], expr)
+
+    def test_fallback(self):
+        "Anything the engine cannot do goes down the Decimal path"
+        for agenda in ('arr a(upper(c))', 'arr (a>3)', 'arr (A)b', 'tap x<2'):
+            self.assertEqual(self._run('numpy', agenda), self._run('decimal', agenda), agenda)
+
+        self.data.insert(0, ['Item', 'Count', 'Size'])
+        self.assertEqual(self._run('numpy', 'arr a(b*2)'), self._run('decimal', 'arr a(b*2)'))
+
+
+class TestTableSQLiteEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = '''
+Town        Pop   Area  When
+------------------------------
+Oxford      152   45.6  2021-03-04
+Cambridge   145   40.7  2021-01-09
+ely         20    59    Tuesday
+# small ones
+Ely         20    1.5   2021-01-09
+New Romney  6.5   5.4   1 May 2020
+
+                  5.4   A19
+Cambridge   3     0.1   A2
+'''.strip().splitlines()
+
+    def _run(self, engine, agenda):
+        tab = tabulate.Table(engine=engine)
+        tab.parse_lines(self.lines)
+        tab.do(agenda)
+        return str(tab)
+
+    def test_matches_decimal(self):
+        for agenda in ('sort', 'sort a', 'sort A', 'sort dC', 'sort @bA', 'uniq', 'uniq a', 'uniq ab', 'sort a uniq a',
+                       'filter c>5', 'filter a=Ely', 'filter len(a)>3 sort d', 'filter @sqrt(c)<5 uniq c',
+                       'sort b filter b>10 sort A uniq b', 'filter row_number>2', 'filter C<100', 'filter c>b',
+                       'sort a arr dcba sort a', 'sort ab tap +1 uniq b', 'filter a=x', 'sort Q', 'filter d<foo('):
+            self.assertEqual(self._run('sqlite', agenda), self._run('decimal', agenda), agenda)
+
+    def test_mirror_lasts_for_one_agenda(self):
+        tab = tabulate.Table(engine='sqlite')
+        tab.parse_lines(self.lines)
+        steps = tab._steps('sort c filter b>10 uniq a')
+        for function, argument in steps:
+            function(argument)
+            self.assertTrue(tab._mirror.tables >= {'c2', 'r2f'})
+        self.assertIsNone(tab._mirror)
+
+
+class TestTableFloatMode(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table(numeric='float')
+        self.tab.parse_lines('''
+Item    Count   Size
+Alpha       3   0.1
+Beta        5   0.2
+Gamma       8   1.25
+'''.strip().splitlines())
+
+    def test_parsing(self):
+        self.assertEqual(tabulate.is_as_float('1,234'), (True, 1234))
+        self.assertEqual(tabulate.is_as_float('25%'), (True, 0.25))
+        self.assertEqual(self.tab.column(2)[1:], [(True, 0.1), (True, 0.2), (True, 1.25)])
+
+    def test_arithmetic(self):
+        "Results are floats shown with 12 significant figures"
+        self.tab.do('arr a(b+c)(c*3)(b/3)')
+        self.assertEqual(str(self.tab), '''
+Item   CountSize  Size*3        Count/3
+Alpha        3.1     0.3              1
+Beta         5.2     0.6  1.66666666667
+Gamma       9.25    3.75  2.66666666667
+'''.strip())
+
+    def test_reductions(self):
+        self.tab.do('add total mean')
+        self.assertEqual(str(self.tab), '''
+Item   Count   Size
+Alpha      3    0.1
+Beta       5    0.2
+Gamma      8   1.25
+Total     16   1.55
+Mean       8  0.775
+'''.strip())
+
+    def test_filter_and_tap(self):
+        self.tab.do('filter c < 1.0 tap sqrt(x)')
+        self.assertEqual(str(self.tab), '''
+Item           Count            Size
+Alpha  1.73205080757  0.316227766017
+Beta    2.2360679775    0.4472135955
+'''.strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -73,3 +73,30 @@ Monday  Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
 
         self.tab.do('filter False')
         self.assertEqual(str(self.tab), "")
+
+    def test_typed_columns(self):
+        self.tab.parse_lines(['x  12  1.5  007', 'y  3  1e1  8', 'z  12  0.25  9', 'w  -4  2  NA'])
+        self.assertEqual(self.tab.typed_column(1).tolist(), [12, 3, 12, -4])
+        self.assertEqual(self.tab.typed_column(2).typecode, 'd')
+        self.assertIsNone(self.tab.typed_column(0))
+        self.assertIsNone(self.tab.typed_column(3))
+        self.assertIsNone(self.tab.typed_column(99))
+
+        # the typed columns give the same answers as the text
+        self.tab.do('filter b>=3 sort c add max')
+        self.assertEqual(str(self.tab), '''
+z    12  0.25    9
+x    12   1.5  007
+y     3   1e1    8
+Max  12  1E+1    9
+'''.strip())
+
+        # moving and dropping rows keeps the arrays, in the new order
+        self.tab.parse_lines(['x  12  1.5', 'y  3  1', 'z  12  0.25', 'w  -4  2'])
+        self.tab.do('sort b filter b<12')
+        self.assertEqual(self.tab.typed_column(1).tolist(), [-4, 3])
+        self.tab.pop(0)
+        self.assertEqual(self.tab.typed_column(1).tolist(), [3])
+        self.assertEqual(self.tab.typed_column(2).typecode, 'q')  # 2 has gone, so it is whole numbers now
+        self.tab.append(['v', '7.5', '1'])
+        self.assertEqual(self.tab.typed_column(1).tolist(), [3, 7.5])
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+
+import io
+import unittest
+
+import tabulate
+
+
+class TestTableHead(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table()
+        self.tab.parse_lines('''
+Item  Count
+-----------
+Apple   3
+Banana  5
+Cherry  2
+# stone fruit
+Damson  7
+-----------
+'''.strip().splitlines())
+
+    def test_head(self):
+        self.tab.do('head 3')
+        self.assertEqual(str(self.tab), '''
+Item    Count
+-------------
+Apple       3
+Banana      5
+'''.strip())
+
+        self.tab.do('head 0')
+        self.assertEqual(str(self.tab), '')
+
+    def test_head_with_header(self):
+        self.tab.do('head @3')
+        self.assertEqual(str(self.tab), '''
+Item    Count
+-------------
+Apple       3
+Banana      5
+Cherry      2
+'''.strip())
+
+        self.tab.do('head')  # default is 10
+        self.assertEqual(len(self.tab), 4)
+
+    def test_head_stops_reading(self):
+        def endless():
+            while True:
+                yield 'Apple  3'
+
+        rest = self.tab.parse_lines(endless(), agenda='tap +1 head 3 sort')
+        self.assertEqual(rest, ['sort'])
+        self.assertEqual(str(self.tab), 'Apple  4\nApple  4\nApple  4')
+
+        self.assertEqual(self.tab._pushable_head('filter b>2 head 5 sort'), ['filter', 'b>2', 'head', '5'])
+        self.assertIsNone(self.tab._pushable_head('sort head 5'))
+        self.assertIsNone(self.tab._pushable_head('filter b>2'))
+
+    def test_head_width(self):
+        "Only the rows read before the head stops count towards the width"
+        lines = 'a  1\nb  5  x  y\nc  3\n'
+        for agenda, expected in (('head 1 make csv', 'a,1\n'), ('head 2 make csv', 'a,1,,\nb,5,x,y\n'),
+                                 ('filter b<4 head 1 make csv', 'a,1\n'), ('filter b<4 head 2 make csv', 'a,1,,\nc,3,,\n')):
+            out = io.StringIO()
+            tabulate.main(agenda.split(), io.StringIO(lines), out)
+            self.assertEqual(out.getvalue(), expected, agenda)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,9 +10,9 @@ class TestTableHelp(unittest.TestCase):
     def setUp(self):
         self.tab = tabulate.Table()
         self.help = '''
-Try one of these: add arr ditto dp dup filter gen group help label
-levels make noblanks nospace pivot pop push roll rule sf shuffle sort
-tap uniq unwrap unzip wrap xp zip
+Try one of these: add arr ditto dp dup explain filter gen group head
+help join label levels make noblanks nospace pivot pop push redo roll
+rule sample sf shuffle sort tap undo uniq unwrap unzip wrap xp zip
         '''.strip()
 
         self.verbs = '''
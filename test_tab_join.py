@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+
+import tabulate
+
+
+class TestTableJoin(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table()
+        self.orders = '''
+Code  Qty
+A     3
+B     10
+# c is new
+C     1
+----
+D     2
+'''.strip().splitlines()
+        self.prices = '''
+Code   Price  Unit
+A      1.20   kg
+B      0.55   each
+D      3.00   kg
+A      1.10   bag
+'''.strip()
+
+    def test_join_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'prices.txt')
+            with open(path, 'w') as fh:
+                fh.write(self.prices)
+
+            self.tab.parse_lines(self.orders)
+            self.tab.do(f'join {path} @a')
+            self.assertEqual(str(self.tab), '''
+Code  Qty  Price  Unit
+A       3   1.20  kg
+A       3   1.10  bag
+B      10   0.55  each
+----------------------
+D       2   3.00  kg'''.strip())
+
+            self.tab.parse_lines(self.orders)
+            self.tab.do(f'join {path} @a left')
+            self.assertEqual(str(self.tab), '''
+Code  Qty  Price  Unit
+A       3   1.20  kg
+A       3   1.10  bag
+B      10   0.55  each
+# c is new
+C       1      -  -
+----------------------
+D       2   3.00  kg'''.strip())
+
+            # a bigger table, so that the file is the smaller side
+            self.tab.parse_lines(self.orders[1:] * 3)
+            self.tab.do(f'join {path} a left')
+            self.assertEqual(len(self.tab), 15)
+            self.assertEqual(self.tab[-1], ['D', '2', '3.00', 'kg'])
+
+    def test_join_stack_and_named(self):
+        self.tab.parse_lines(['x  1', 'y  2', '1  p', '3  q'])
+        self.tab.do('pop pop join stack b=a left')
+        self.assertEqual(str(self.tab), 'x  1  p\ny  2  -')
+
+        self.tab.named_tables['n'] = [[2, 'two'], [1, 'one'], [1, 'uno']]
+        self.tab.do('arr ab join n b=a')
+        self.assertEqual(str(self.tab), 'x  1  one\nx  1  uno\ny  2  two')
+
+        other = tabulate.Table()
+        other.parse_lines(['one  1', 'two  2'])
+        self.tab.named_tables['other'] = other
+        self.tab.do('join other cb=ab arr ab')
+        self.assertEqual(str(self.tab), 'x  1\ny  2')  # uno has no match
+
+    def test_join_errors(self):
+        self.tab.parse_lines(['x  1'])
+        for agenda, message in (('join', '?! join source [keys] [left]'),
+                                ('join no-such-table', '?! join source no-such-table'),
+                                ('join stack c', '?! join keys c'),
+                                ('join stack ab=a', '?! join keys ab=a')):
+            self.tab.do(agenda)
+            self.assertEqual(self.tab.messages, [message], agenda)
+            self.tab.messages.clear()
+        self.assertEqual(self.tab.data, [['x', '1']])
+
+        # the keys of the other table are checked once we have read it
+        self.tab.named_tables['n'] = [['x', 'one'], ['y', 'two']]
+        for agenda in ('join n a=c', 'join n @a=c', 'join n ab=ac left'):
+            self.tab.do(agenda)
+            self.assertEqual(self.tab.messages, ['?! join keys ' + agenda.split()[2]], agenda)
+            self.tab.messages.clear()
+        self.assertEqual(self.tab.data, [['x', '1']])
+
+    def test_join_empty(self):
+        self.tab.named_tables['n'] = [['Code', 'Price'], ['A', '1.20']]
+        for agenda in ('join n', 'join n @a', 'join n a=b left'):
+            self.tab.do(agenda)
+            self.assertEqual((self.tab.data, self.tab.messages), ([], []), agenda)
+
+
+if __name__ == '__main__':
+    unittest.main()
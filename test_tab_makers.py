@@ -1,5 +1,6 @@
 #! /usr/bin/env python3
 
+import io
 import unittest
 
 import tabulate
@@ -117,3 +118,20 @@ Monday    \tWeek\tMon\tTue\tWed\tThu\tFri\tSat\t Sun\tTotal
 
         self.tab.do("make pipe")
         self.assertEqual(str(self.tab), self.as_markdown)
+
+    def test_write(self):
+        "write straight to a file"
+        self.tab.parse_lines(self.rain.splitlines())
+        for form, expected in (('plain', self.rain), ('csv', self.as_csv), ('tsv', self.as_tsv),
+                               ('tex', self.as_tex), ('latex', self.as_latex), ('pipe', self.as_markdown)):
+            out = io.StringIO()
+            count = self.tab.write(out, form)
+            self.assertEqual(out.getvalue(), expected + '\n')
+            self.assertEqual(count, expected.count('\n') + 1)
+
+        # the form is not changed, and messages come first
+        self.tab.do('undefined')
+        out = io.StringIO()
+        self.tab.write(out)
+        self.assertEqual(out.getvalue(), '?? undefined\n' + self.rain + '\n')
+        self.assertEqual(self.tab.messages, [])
@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+"Tests for the agenda planner"
+
+import random
+import unittest
+
+import tabulate
+
+
+class TestTablePlanner(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        self.rows = [['Name', 'Group', 'Score', 'Size', 'Ratio']]
+        for i in range(60):
+            self.rows.append([random.choice('abcAB'), random.randint(0, 5), random.randint(0, 9),
+                              random.choice('xyX'), round(random.random() * 10, 2)])
+
+    def _explain(self, agenda):
+        tab = tabulate.Table()
+        tab.parse_lol(self.rows)
+        tab.do('explain ' + agenda)
+        return tab.messages
+
+    def _same(self, agenda):
+        plain = tabulate.Table()
+        plain.parse_lol(self.rows)
+        plain.do(agenda)
+        planned = tabulate.Table(optimize=True)
+        planned.parse_lol(self.rows)
+        planned.do(agenda)
+        self.assertEqual(str(planned), str(plain), agenda)
+
+    def test_explain(self):
+        self.assertEqual(self._explain('sort b filter c>4'), ['# plan: filter c>4', '# plan: sort b'])
+        self.assertEqual(self._explain('sort @b filter @row_number>4'), ['# plan: sort @b', '# plan: filter @row_number>4'])
+        self.assertEqual(self._explain('arr ebc arr ba'), ['# plan: arr be'])
+        self.assertEqual(self._explain('arr a(c*2) arr -a'), ['# plan: arr (c*2)'])
+        self.assertEqual(self._explain('arr ab arr b'), ['# plan: arr b'])
+        self.assertEqual(self._explain('sort ab uniq ab'), ['# plan: sort+uniq ab'])
+        self.assertEqual(self._explain('filter c>4 sort B arr ae'), [
+            '# plan: arr abce', '# plan: filter c>4', '# plan: sort B', '# plan: arr ad'])
+        self.assertEqual(self._explain(''), ['# plan: nothing to do'])
+
+    def test_explain_leaves_table_alone(self):
+        tab = tabulate.Table()
+        tab.parse_lol(self.rows)
+        expected = str(tab)
+        tab.do('explain sort a')
+        self.assertEqual(str(tab), '# plan: sort a\n' + expected)
+
+    def test_no_rewrite_with_special_rows(self):
+        "Sort and filter move special rows differently"
+        tab = tabulate.Table()
+        tab.parse_lol(self.rows)
+        tab.add_rule(1)
+        tab.do('explain sort b filter c>4')
+        self.assertEqual(tab.messages, ['# plan: sort b', '# plan: filter c>4'])
+
+    def test_same_results(self):
+        for agenda in (
+            'sort b filter c>4',
+            'sort @c filter @d=x',
+            'sort C filter C>100',
+            'arr ebc arr ba',
+            'arr a(c*2)e arr cb',
+            'arr -bd arr ba',
+            'sort ab uniq ab',
+            'sort @aB uniq @ab',
+            'sort uniq',
+            'filter c>4 sort B uniq b arr ae',
+            'filter C<200 sort d arr d(b+c)',
+            'sort e uniq b arr -cd',
+        ):
+            self._same(agenda)
+
+
+if __name__ == '__main__':
+    unittest.main()
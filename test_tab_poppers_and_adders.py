@@ -205,3 +205,13 @@ Mean       0.718074010601       0.378460968033
 
         self.tab.do("pop push 94")  # index out of bounds ok on insert
         self.assertEqual(str(self.tab), self.sorted_by_total)
+
+    def test_extras_lookup(self):
+        self.tab.parse_lines("a 1\nb 2\n---\nc 3\n\nd 4".splitlines())
+        self.assertEqual(list(self.tab.extras.items()), [(2, {'rule'}), (3, {'blank'})])
+
+        # looking for markers does not add any
+        self.tab.tabulate()
+        self.tab.do("noblanks add")
+        self.assertEqual(list(self.tab.extras.items()), [(2, {'rule'})])
+        self.assertEqual(self.tab.extras[1], frozenset())
@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+import unittest
+
+import tabulate
+
+
+class TestTableSample(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table()
+        self.lines = ['Item  Count', '-----------'] + [f'Item{i}  {i}' for i in range(1, 201)]
+        self.tab.parse_lines(self.lines)
+
+    def test_sample(self):
+        self.tab.do('sample 5')
+        self.assertEqual(len(self.tab), 5)
+        self.assertEqual(self.tab.column(1), sorted(self.tab.column(1)))  # still in order
+        self.assertNotIn('rule', self.tab.extras[1])
+
+    def test_sample_with_header_and_seed(self):
+        self.tab.do('sample @4 42')
+        first = str(self.tab)
+        self.assertEqual(len(self.tab), 5)
+        self.assertEqual(self.tab[0], ['Item', 'Count'])
+        self.assertTrue(first.splitlines()[1].startswith('---'))
+
+        self.tab.parse_lines(self.lines)
+        self.tab.do('sample @4 42')
+        self.assertEqual(str(self.tab), first)
+
+        # the same sample when it is done as the lines are read
+        rest = self.tab.parse_lines(self.lines, agenda='sample @4 42')
+        self.assertEqual(rest, [])
+        self.assertEqual(str(self.tab), first)
+
+    def test_small_table(self):
+        self.tab.parse_lines(self.lines[:5])
+        self.tab.do('sample')
+        self.assertEqual(len(self.tab), 4)
+
+    def test_empty_sample(self):
+        self.tab.do('sample 0')
+        self.assertEqual((len(self.tab), self.tab.cols), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
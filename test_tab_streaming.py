@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+
+import io
+import itertools
+import unittest
+
+import tabulate
+
+
+class TestTableStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table()
+        self.towns = '''
+Town        Pop   Area
+------------------------
+Oxford      152   45.6
+Cambridge   145   40.7
+"           3     0.1
+# small ones
+Ely         20    59
+"           1.5   1.2
+New Romney  6.5   5.4
+------------------------
+'''.strip()
+
+    def whole_and_streamed(self, agenda):
+        "Do the agenda to the whole table, then again as the table is read"
+        whole = tabulate.Table()
+        whole.parse_lines(self.towns.splitlines())
+        whole.do(agenda)
+
+        streamed = tabulate.Table()
+        rest = streamed.parse_lines(self.towns.splitlines(), agenda=agenda)
+        streamed.do(rest)
+        return str(whole), str(streamed)
+
+    def test_same_results(self):
+        for agenda in ('filter b>10', 'filter @b>10', 'ditto', 'nospace', 'nospace -', 'dp 20',
+                       'sf 2', 'tap *2', 'arr a(b/c)', 'arr aB(row_number)', 'ditto filter c<50 arr ca dp 1',
+                       'filter row_number>2 sort b', 'arr a(b/rows) sort', 'tap x/total'):
+            whole, streamed = self.whole_and_streamed(agenda)
+            self.assertEqual(whole, streamed, agenda)
+
+    def test_ragged_rows(self):
+        "Short rows are filled out before the row-local verbs see them"
+        for lines in (['1  2  3', '7  8', '3  4  9'], ['1  2', '7  8  1', '3  4  9  5']):
+            for agenda in ('arr cb', 'arr (a+c)b', 'tap +1', 'dp 10', 'sf 2', 'nospace'):
+                if agenda.startswith('arr') and len(lines[0].split()) < 3:
+                    continue  # the columns come from the first row
+                whole = tabulate.Table()
+                whole.parse_lines(lines)
+                whole.do(agenda)
+                streamed = tabulate.Table()
+                streamed.do(streamed.parse_lines(lines, agenda=agenda))
+                self.assertEqual(str(whole), str(streamed), agenda)
+
+            # a head lets the command line stop reading early, but only if the columns are all there
+            whole = tabulate.Table()
+            whole.parse_lines(lines)
+            whole.do('tap x+1 arr cb head 5')
+            out = io.StringIO()
+            tabulate.main(['tap', 'x+1', 'arr', 'cb', 'head', '5'], io.StringIO('\n'.join(lines)), out)
+            self.assertEqual(out.getvalue(), str(whole) + '\n', lines)
+
+    def test_rest_of_agenda(self):
+        rest = self.tab.parse_lines(self.towns.splitlines(), agenda='filter @b>10 dp 1 sort c arr bc tap +1')
+        self.assertEqual(rest, ['sort', 'c', 'arr', 'bc', 'tap', '+1'])
+        self.assertEqual(len(self.tab.data), 4)
+
+        # totals need the whole table
+        rest = self.tab.parse_lines(self.towns.splitlines(), agenda='tap x/total')
+        self.assertEqual(rest, ['tap', 'x/total'])
+
+        # no agenda means no streaming
+        rest = self.tab.parse_lines(self.towns.splitlines())
+        self.assertIsNone(rest)
+
+    def test_filter_keeps_extras_with_rows(self):
+        self.tab.parse_lines(self.towns.splitlines(), agenda='filter c<1 or c>50')
+        expected = '''
+Town  Pop  Area
+---------------
+"       3   0.1
+# small ones
+Ely    20    59
+'''.strip()
+        self.assertEqual(str(self.tab), expected)
+
+        self.tab.parse_lines(self.towns.splitlines())
+        self.tab.do('filter c<1 or c>50')
+        self.assertEqual(str(self.tab), expected)
+
+    def test_pushable_filter(self):
+        self.assertEqual(self.tab._pushable_filter('filter @b>10 sort c'), ['filter', '@b>10'])
+        self.assertEqual(self.tab._pushable_filter(['filter', 'a=Ely', 'or', 'c<1']), ['filter', 'a=Ely', 'or', 'c<1'])
+        for agenda in ('sort c filter b>10', 'filter row_number>2', 'filter B<300', 'filter b>rows',
+                       'filter b=>4', 'filter', ''):
+            self.assertIsNone(self.tab._pushable_filter(agenda), agenda)
+
+        # only the columns in the first row are there for every row
+        self.assertEqual(self.tab._pushable_filter('filter b>1', 2), ['filter', 'b>1'])
+        self.assertIsNone(self.tab._pushable_filter('filter c>1', 2))
+        self.assertIsNone(self.tab._pushable_head('filter c>1 head 2', 2))
+
+    def test_ragged_filter(self):
+        "Pushing the filter down should give the same rows as filtering the whole table"
+        for lines in (['1  2  1', '7  8', '3  4  9'], ['1  2', '7  8  1', '3  4  9']):
+            whole = tabulate.Table()
+            whole.parse_lines(lines)
+            whole.do('filter c>5')
+            for agenda in (['filter', 'c>5'], ['filter', 'c>5', 'head', '5']):
+                out = io.StringIO()
+                tabulate.main(agenda, io.StringIO('\n'.join(lines)), out)
+                self.assertEqual(out.getvalue(), str(whole) + '\n', lines)
+
+        # the table is as wide as the widest row read, even if the filter drops it
+        lines = ['a  1', 'b  5  x  y', 'c  3']
+        for agenda in ('filter b<4 make csv', 'filter b<4 add', 'filter b<4 arr ba'):
+            whole = tabulate.Table()
+            whole.parse_lines(lines)
+            whole.do(agenda)
+            for options in ([], ['--spill']):
+                if options and 'add' in agenda:
+                    continue  # add cannot be spilled
+                out = io.StringIO()
+                tabulate.main(options + agenda.split(), io.StringIO('\n'.join(lines)), out)
+                self.assertEqual(out.getvalue(), str(whole) + '\n', agenda)
+
+    def test_projection(self):
+        self.assertEqual(self.tab._pushable_projection('arr ca sort', 3), ([2, 0], None, ['arr', 'ca']))
+        self.assertEqual(self.tab._pushable_projection('arr -b', 3), (None, [1], ['arr', '-b']))
+        for agenda in ('arr a(b/c)', 'arr xyz', 'arr ~', 'arr abA', 'sort arr ab', 'arr', 'arr ad', 'arr -d'):
+            self.assertIsNone(self.tab._pushable_projection(agenda, 3), agenda)
+
+        for agenda in ('arr ca', 'arr -b', 'arr cc', 'arr b..a'):
+            fields, skip, _ = self.tab._pushable_projection(agenda, 3)
+            whole, projected = tabulate.Table(), tabulate.Table()
+            whole.parse_lines(self.towns.splitlines())
+            whole.do(agenda)
+            projected.parse_lines(self.towns.splitlines(), fields=fields, skip=skip)
+            self.assertEqual(str(whole), str(projected), agenda)
+
+        # on the command line, letters past the widest row are not columns
+        for agenda, expected in (('arr ac make csv', '1\n3\n'), ('arr ca add', '1\n3\n4\n')):
+            out = io.StringIO()
+            tabulate.main(agenda.split(), io.StringIO('1  2\n3  4\n'), out)
+            whole = tabulate.Table()
+            whole.parse_lines(['1  2', '3  4'])
+            whole.do(agenda)
+            self.assertEqual(out.getvalue(), str(whole) + '\n', agenda)
+
+    def test_spill(self):
+        for agenda in ('', 'filter b>10', 'ditto arr cab make pipe', 'dp 1 make tex', 'make csv'):
+            whole = tabulate.Table()
+            whole.parse_lines(self.towns.splitlines())
+            whole.do(agenda)
+
+            spilled = tabulate.Table()
+            spilled.spill(io.BytesIO())
+            rest = spilled.parse_lines(self.towns.splitlines(), agenda=agenda)
+            spilled.do(rest)
+            self.assertEqual(spilled.data, [])
+            self.assertEqual(list(spilled.tabulate()), list(whole.tabulate()), agenda)
+
+        self.assertTrue(self.tab._spillable('filter b>10 tap +1 make tex'))
+        self.assertFalse(self.tab._spillable('filter b>10 sort'))
+
+    def test_spill_more(self):
+        "Reading more rows after only some of the spill file was read back keeps the rows already there"
+        lines = self.towns.splitlines()
+        whole = tabulate.Table()
+        whole.parse_lines(lines + lines)
+
+        spilled = tabulate.Table()
+        spilled.spill(io.BytesIO())
+        spilled.parse_lines(lines)
+        self.assertEqual(len(list(itertools.islice(spilled.tabulate(), 2))), 2)
+        spilled.parse_lines(lines, append=True)
+        self.assertEqual(list(spilled.tabulate()), list(whole.tabulate()))
+
+    def test_other_sources(self):
+        lol = [['a', '1'], [], ['b', '2'], ['---'], ['c', '3']]
+        rest = self.tab.parse_lol(lol, agenda='tap *3 arr ba')
+        self.assertEqual(rest, [])
+        self.assertEqual(str(self.tab), '3  a\n\n6  b\n----\n9  c')
+
+        tex = [r'a & 1 \cr', r'\hline', r'b & 2 \cr', r'% note', r'c & 3 \cr']
+        rest = self.tab.parse_tex(tex, agenda='filter b>1 make tex')
+        self.assertEqual(rest, ['make', 'tex'])
+        self.assertEqual(str(self.tab), '----\nb  2\n# note\nc  3')
+
+
+if __name__ == '__main__':
+    unittest.main()
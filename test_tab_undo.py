@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+import unittest
+
+import tabulate
+
+
+class TestTableUndo(unittest.TestCase):
+
+    def setUp(self):
+        self.tab = tabulate.Table(history=10)
+        self.tab.parse_lines('''
+Name   Score
+------------
+Ann        7
+Bill      12
+Cy         3
+'''.strip().splitlines())
+        self.original = str(self.tab)
+
+    def test_undo_and_redo(self):
+        self.tab.do('sort b')
+        sorted_table = str(self.tab)
+        self.tab.do('filter b>5 tap +1')
+        self.tab.do('undo 2')
+        self.assertEqual(str(self.tab), sorted_table)
+        self.tab.do('undo')
+        self.assertEqual(str(self.tab), self.original)
+        self.tab.do('undo')  # nothing more to undo == nop
+        self.assertEqual(str(self.tab), self.original)
+
+        self.tab.do('redo 3')
+        self.assertEqual(str(self.tab), 'Name  Score\n-----------\nAnn       8\nBill     13')
+
+        # doing something else forgets the redo
+        self.tab.do('undo xp redo')
+        self.assertEqual(str(self.tab), 'Name   Ann  Bill\nScore  7    12')
+
+    def test_undo_in_agenda(self):
+        self.tab.optimize = True
+        self.tab.do('sort B filter b<10 undo')
+        self.assertEqual(str(self.tab), 'Name  Score\n-----------\nBill     12\nAnn       7\nCy        3')
+
+        self.tab.do('make csv undo 9')
+        self.assertEqual(str(self.tab), self.original)
+
+    def test_shared_rows(self):
+        self.tab.do('sort b tap +0')
+        before_sort, before_tap = list(self.tab._past)[-2:]
+        self.assertIs(before_tap[0][0], before_sort[0][0])  # the header did not change
+        self.assertIn(before_sort[0][2], before_tap[0])
+
+    def test_undo_formula_sort(self):
+        "Sorting on a formula uses do itself, but it is still only one step"
+        self.tab.do('sort (-b)')
+        self.assertEqual(len(self.tab._past), 1)
+        self.tab.do('undo')
+        self.assertEqual(str(self.tab), self.original)
+
+    def test_history(self):
+        self.tab.history = 2
+        self.tab.do('tap +1 tap +1 tap +1 undo 3')
+        self.assertEqual(str(self.tab), 'Name  Score\n-----------\nAnn       8\nBill     13\nCy        4')
+
+        # with no history, undo still works inside one agenda, but nothing is kept after it
+        self.tab = tabulate.Table()
+        self.tab.parse_lines(self.original.splitlines())
+        self.tab.do('tap +1 tap +1 undo')
+        self.assertEqual(len(self.tab._past), 0)
+        self.assertEqual(str(self.tab), 'Name  Score\n-----------\nAnn       8\nBill     13\nCy        4')
+        self.tab.do('sort b')
+        self.tab.do('undo')
+        self.assertEqual([row[1] for row in self.tab], ['Score', '4', '8', '13'])  # nothing to go back to
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import doctest
+import io
 import unittest
 
 import tabulate
@@ -404,6 +405,81 @@ Mean  Mean  2  2
 '''.strip()
         self.assertEqual(str(self.tab), expected)
 
+    def test_growing_table(self):
+        self.tab.append(['Name', 'Score'])
+        self.tab.append(['Ann', '7'])
+        self.assertEqual(str(self.tab), 'Name  Score\nAnn   7')
+        self.assertEqual(self.tab._measured, 2)
+
+        # new rows are measured as they come in
+        self.tab.append(['Bartholomew', '12'])
+        self.tab.append(['Cy', '3', 'late'])
+        self.assertEqual(self.tab._measured, 4)
+        self.assertEqual(str(self.tab), '''
+Name         Score
+Ann              7
+Bartholomew     12
+Cy               3  late
+'''.strip())
+
+        # verbs mean we have to measure again
+        self.tab.do('filter b>5')
+        self.assertIsNone(self.tab._measured)
+        self.assertEqual(str(self.tab), 'Name         Score\nAnn              7\nBartholomew     12')
+
+        self.tab.pop()
+        self.assertEqual(str(self.tab), 'Name  Score\nAnn   7')
+
+    def test_window(self):
+        self.tab.parse_lines('''
+Name         Score
+-----------------
+Ann              7
+Bartholomew     12
+# late entries
+Cy               3
+Di             100
+'''.strip().splitlines())
+        self.assertEqual(list(self.tab.tabulate(2, 4)), [
+            'Bartholomew     12',
+            '# late entries',
+            'Cy               3',
+        ])
+        self.assertEqual(list(self.tab.tabulate(-1)), ['Di             100'])
+        self.assertEqual(list(self.tab.tabulate(stop=1)), ['Name         Score'])
+        self.assertEqual(list(self.tab.tabulate(9, 99)), [])
+
+        # the widths are for the whole table, and they are remembered
+        self.assertEqual(self.tab._measured, 5)
+
+    def test_window_spilled(self):
+        "A window of a spilled table, and then more rows, as for a table in memory"
+        lines = ['Ann  7', 'Bartholomew  12', 'Cy  3']
+        whole = tabulate.Table()
+        whole.parse_lines(lines)
+        self.tab.spill(io.BytesIO())
+        self.tab.parse_lines(lines)
+        self.assertEqual(list(self.tab.tabulate(1, 2)), list(whole.tabulate(1, 2)))
+        whole.parse_lines(['Di  100'], append=True)
+        self.tab.parse_lines(['Di  100'], append=True)
+        self.assertEqual(list(self.tab.tabulate()), list(whole.tabulate()))
+        self.assertEqual(list(self.tab.tabulate(-2)), ['Cy             3', 'Di           100'])
+
+    def test_shared_values(self):
+        self.tab.parse_lines(['web01  up  3', 'web02  down  3', 'web01  up  4'])
+        self.assertIs(self.tab.data[0][0], self.tab.data[2][0])
+        self.assertIs(self.tab.data[0][1], self.tab.data[2][1])
+        self.assertEqual(list(map(len, self.tab._values)), [2, 2, 2])
+
+        # only keep so many different values in each column
+        self.tab.distinct_values = 2
+        self.tab.parse_lines(['web01  up  3', 'web02  up  3', 'web03  down  4', 'web04  down  4'])
+        self.assertIsNone(self.tab._values[0])
+        self.assertIs(self.tab.data[2][1], self.tab.data[3][1])  # the other columns still share
+        self.assertIs(self.tab.data[2][2], self.tab.data[3][2])
+        self.tab.do('sort bA uniq b')
+        self.assertEqual(str(self.tab), 'web04  down  4\nweb02  up    3')
+
     def test_nothing(self):
         some_lines = '''
 Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total